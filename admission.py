@@ -0,0 +1,211 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, jsonify, request
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+# Endpoints customers can hit without logging in; these get token-bucket limits
+PUBLIC_ENDPOINTS = {'view_menu', 'view_cart', 'place_order', 'order_confirmation',
+                    'search_menu', 'wait_time', 'get_menu'}
+# Never shed ahead of browsing: taking money and running the kitchen come first
+CRITICAL_ENDPOINTS = {'place_order', 'update_order_status', 'get_orders', 'admin_login'}
+EXEMPT_ENDPOINTS = {'static'}
+
+
+def parse_rate(value):
+    """Parse "<tokens>/<seconds>[:<burst>]", e.g. "10/1:30" -> (10.0, 30.0)."""
+    rate, _, burst = str(value).partition(':')
+    tokens, _, seconds = rate.partition('/')
+    per_second = float(tokens) / float(seconds or 1)
+    return per_second, float(burst) if burst else max(float(tokens), 1.0)
+
+
+class MemoryStore:
+    """Token buckets kept in this process, at most ``max_buckets`` of them.
+
+    Past the cap the least recently used bucket is dropped, so random ids or
+    addresses can't grow the store without bound.
+    """
+
+    def __init__(self, max_buckets=100000):
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self._calls = 0
+
+    def consume(self, key, rate, burst, now=None):
+        """Take one token; returns seconds to wait, or 0 if the call is allowed."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                wait = 0
+            else:
+                self._buckets[key] = (tokens, now)
+                wait = (1 - tokens) / rate
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+            self._calls += 1
+            if self._calls % 10000 == 0:
+                self._prune(now)
+            return wait
+
+    def _prune(self, now):
+        # Drop buckets that have been idle long enough to be full again
+        for key, (tokens, updated) in list(self._buckets.items()):
+            if now - updated > 3600:
+                del self._buckets[key]
+
+
+class RedisStore:
+    """Token buckets shared between worker processes through Redis."""
+
+    SCRIPT = """
+    local rate = tonumber(ARGV[1])
+    local burst = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(bucket[1]) or burst
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + (now - updated) * rate)
+    local wait = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        wait = (1 - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+    return tostring(wait)
+    """
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('RATELIMIT_STORAGE_URL points at Redis but the redis package is not installed')
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    def consume(self, key, rate, burst, now=None):
+        now = time.time() if now is None else now
+        return float(self._script(keys=[f'ratelimit:{key}'], args=[rate, burst, now]))
+
+
+def make_store(url, max_buckets=100000):
+    if not url or url.startswith('memory://'):
+        return MemoryStore(max_buckets)
+    if url.startswith(('redis://', 'rediss://')):
+        return RedisStore(url)
+    raise ValueError(f'Unsupported RATELIMIT_STORAGE_URL: {url}')
+
+
+class AdmissionController:
+    """Per-IP and per-restaurant rate limits plus concurrency-based load shedding."""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self._reset_metrics()
+        if app is not None:
+            self.init_app(app)
+
+    def _reset_metrics(self):
+        self.counters = {
+            'admitted': 0,
+            'throttled_ip': 0,
+            'throttled_restaurant': 0,
+            'shed_browse': 0,
+            'shed_critical': 0
+        }
+
+    def init_app(self, app):
+        self.enabled = app.config.get('ADMISSION_CONTROL_ENABLED', True)
+        self.store = make_store(app.config.get('RATELIMIT_STORAGE_URL'),
+                                app.config.get('RATELIMIT_MAX_BUCKETS', 100000))
+        self.ip_limit = parse_rate(app.config.get('RATELIMIT_PER_IP', '5/1:30'))
+        self.restaurant_limit = parse_rate(app.config.get('RATELIMIT_PER_RESTAURANT', '100/1:300'))
+        self.max_concurrency = app.config.get('MAX_CONCURRENT_REQUESTS', 200)
+        self.browse_concurrency = app.config.get('MAX_CONCURRENT_BROWSE_REQUESTS', 150)
+        self.in_flight = 0
+        self._reset_metrics()
+
+        # Behind a load balancer remote_addr is the balancer; take the client from X-Forwarded-For
+        trusted_proxies = app.config.get('RATELIMIT_TRUSTED_PROXIES', 0)
+        if trusted_proxies:
+            app.wsgi_app = ProxyFix(app.wsgi_app, x_for=trusted_proxies, x_proto=trusted_proxies)
+
+        app.before_request(self.before_request)
+        app.teardown_request(self.teardown_request)
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _reject(self, status, message, retry_after=None):
+        response = jsonify({'success': False, 'message': message})
+        response.status_code = status
+        if retry_after is not None:
+            response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return response
+
+    def _restaurant_id(self):
+        """The request's restaurant as an int, None if absent; raises ValueError if malformed."""
+        rid = request.args.get('rid')
+        if rid is None and request.endpoint == 'place_order':
+            data = request.get_json(silent=True)
+            cart = (data.get('cart') if isinstance(data, dict) else None) or {}
+            rid = cart.get('restaurantId') if isinstance(cart, dict) else None
+        if rid is None:
+            return None
+        # "01", " 1" and "1" are the same restaurant and must share one bucket
+        if isinstance(rid, bool) or not isinstance(rid, (int, str)):
+            raise ValueError(rid)
+        return int(rid)
+
+    def before_request(self):
+        if not self.enabled or request.endpoint in EXEMPT_ENDPOINTS or request.endpoint is None:
+            return None
+
+        if request.endpoint in PUBLIC_ENDPOINTS:
+            wait = self.store.consume(f'ip:{request.remote_addr}', *self.ip_limit)
+            if wait:
+                self._count('throttled_ip')
+                return self._reject(429, 'Too many requests, please slow down', wait)
+            try:
+                rid = self._restaurant_id()
+            except ValueError:
+                return self._reject(400, 'Invalid restaurant id')
+            if rid is not None:
+                wait = self.store.consume(f'restaurant:{rid}', *self.restaurant_limit)
+                if wait:
+                    self._count('throttled_restaurant')
+                    return self._reject(429, 'This restaurant is very busy, please try again shortly', wait)
+
+        critical = request.endpoint in CRITICAL_ENDPOINTS or request.path.startswith('/admin')
+        limit = self.max_concurrency if critical else self.browse_concurrency
+        with self._lock:
+            if self.in_flight >= limit:
+                self.counters['shed_critical' if critical else 'shed_browse'] += 1
+                return self._reject(503, 'Server is busy, please try again', 1)
+            self.in_flight += 1
+            self.counters['admitted'] += 1
+        g.admitted = True
+        return None
+
+    def teardown_request(self, exc):
+        if g.pop('admitted', False):
+            with self._lock:
+                self.in_flight -= 1
+
+    def metrics(self):
+        with self._lock:
+            return dict(self.counters, in_flight=self.in_flight)
+
+
+admission = AdmissionController()
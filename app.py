@@ -1,17 +1,29 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, send_from_directory
 from flask_socketio import SocketIO, emit
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 from functools import wraps
 from extensions import db, migrate
 from models import Restaurant, MenuItem, Table, Order, OrderItem
+from menu_index import menu_index
+from importer import import_data, ImportValidationError
+from tasks import task_queue
+from routing import replica_read, restaurant_scope, each_shard
+from sharding import create_restaurant, find_restaurant_id
+from order_board import order_board, load_order_payloads, order_event_payload, ACTIVE_STATUSES, ORDER_STATUSES
+from wait_times import prep_time_stats, record_transition
+from admission import admission
+from menu_sync import menu_snapshot, menu_version
+from serializers import JSONProvider, SocketJSON
+import routing
 import os
 from datetime import datetime
 
-socketio = SocketIO()
+socketio = SocketIO(json=SocketJSON)
 
 def create_app():
     app = Flask(__name__)
+    app.json = JSONProvider(app)
     
     # Load configuration
     app.config.from_pyfile('config.py')
@@ -20,6 +32,18 @@ def create_app():
     db.init_app(app)
     migrate.init_app(app, db)
     socketio.init_app(app)
+    task_queue.init_app(app, socketio)
+    # Admission first: throttled and shed requests shouldn't cost a shard lookup
+    admission.init_app(app)
+    routing.init_app(app)
+    
+    # Menu indexes are per-process and rebuilt lazily against this app's database
+    menu_index.clear()
+    prep_time_stats.clear()
+    
+    # Warm the kitchen's active-order board from the database
+    with app.app_context():
+        order_board.warm()
     
     # Ensure the uploads directory exists
     uploads_dir = os.path.join(app.static_folder, 'uploads')
@@ -27,11 +51,35 @@ def create_app():
     
     # Home page route
     @app.route('/')
+    @replica_read
     def home():
-        # Get featured restaurants
-        restaurants = Restaurant.query.limit(3).all()
+        # Get featured restaurants from every shard, keeping the first three by id
+        restaurants = {}
+        for shard in each_shard():
+            for restaurant in Restaurant.query.order_by(Restaurant.id).limit(3):
+                restaurants[restaurant.id] = restaurant
+        restaurants = [restaurants[rid] for rid in sorted(restaurants)[:3]]
         return render_template('index.html', restaurants=restaurants, current_year=datetime.now().year)
     
+    # Post-commit task: add a new order to the kitchen's active-order board
+    @task_queue.task
+    def board_new_order(restaurant_id, order_id):
+        with restaurant_scope(restaurant_id):
+            order_board.refresh(order_id)
+    
+    # Post-commit task: broadcast a new order to the dashboards
+    @task_queue.task
+    def broadcast_new_order(restaurant_id, order_id):
+        with restaurant_scope(restaurant_id):
+            socketio.emit('new_order', order_event_payload(order_id))
+    
+    # Post-commit task: feed a finished status into the prep-time sketches
+    @task_queue.task
+    def record_status_duration(restaurant_id, order_id, status, entered_at, left_at):
+        with restaurant_scope(restaurant_id):
+            prep_time_stats.record(restaurant_id, order_id, status,
+                                   datetime.fromisoformat(entered_at), datetime.fromisoformat(left_at))
+    
     # Login required decorator
     def login_required(f):
         @wraps(f)
@@ -49,7 +97,12 @@ def create_app():
             email = request.form.get('email')
             password = request.form.get('password')
             
-            restaurant = Restaurant.query.filter_by(email=email).first()
+            # The directory says which shard holds the restaurant
+            restaurant = None
+            restaurant_id = find_restaurant_id(email)
+            if restaurant_id is not None:
+                with restaurant_scope(restaurant_id):
+                    restaurant = Restaurant.query.get(restaurant_id)
             
             if restaurant and check_password_hash(restaurant.password, password):
                 session['restaurant_id'] = restaurant.id
@@ -77,8 +130,7 @@ def create_app():
                 return redirect(url_for('admin_register'))
             
             # Check if email is already registered
-            existing_restaurant = Restaurant.query.filter_by(email=email).first()
-            if existing_restaurant:
+            if find_restaurant_id(email) is not None:
                 flash('Email is already registered', 'error')
                 return redirect(url_for('admin_register'))
             
@@ -91,8 +143,8 @@ def create_app():
                 logo.save(logo_path)
                 logo_url = url_for('static', filename=f'uploads/{filename}')
             
-            # Create new restaurant
-            new_restaurant = Restaurant(
+            # Create new restaurant on the least loaded shard
+            create_restaurant(
                 name=name,
                 email=email,
                 password=generate_password_hash(password),
@@ -100,9 +152,6 @@ def create_app():
                 logo_url=logo_url
             )
             
-            db.session.add(new_restaurant)
-            db.session.commit()
-            
             flash('Registration successful! Please log in.', 'success')
             return redirect(url_for('admin_login'))
         
@@ -142,44 +191,35 @@ def create_app():
     # API endpoint to get orders
     @app.route('/api/orders')
     @login_required
+    @replica_read
     def get_orders():
         status = request.args.get('status', 'all')
         restaurant_id = session['restaurant_id']
         
+        # Active orders are served from the in-memory board
+        if status == 'active' or status in ACTIVE_STATUSES:
+            return app.response_class(order_board.orders_json(restaurant_id, status),
+                                      mimetype='application/json')
+        
         if status == 'all':
-            orders = Order.query.filter_by(restaurant_id=restaurant_id).order_by(Order.created_at.desc()).all()
+            orders_list = load_order_payloads(Order.restaurant_id == restaurant_id)
         else:
-            orders = Order.query.filter_by(restaurant_id=restaurant_id, status=status).order_by(Order.created_at.desc()).all()
-        
-        orders_list = []
-        for order in orders:
-            items = []
-            for item in order.order_items:
-                menu_item = MenuItem.query.get(item.menu_item_id)
-                items.append({
-                    'id': item.id,
-                    'name': menu_item.name,
-                    'quantity': item.quantity,
-                    'price': item.price,
-                    'special_instructions': item.special_instructions
-                })
-            
-            orders_list.append({
-                'id': order.id,
-                'table_number': order.table.table_number,
-                'status': order.status,
-                'total_amount': order.total_amount,
-                'created_at': order.created_at.isoformat(),
-                'items': items
-            })
+            orders_list = load_order_payloads(Order.restaurant_id == restaurant_id, Order.status == status)
         
         return jsonify(orders_list)
     
+    # API endpoint to compare the active-order board with the database
+    @app.route('/api/orders/board/check')
+    @login_required
+    def check_order_board():
+        repair = request.args.get('repair', '').lower() in ('1', 'true', 'yes')
+        return jsonify(order_board.check(session['restaurant_id'], repair=repair))
+    
     # API endpoint to update order status
     @app.route('/api/orders/<int:order_id>/status', methods=['PUT'])
     @login_required
     def update_order_status(order_id):
-        data = request.json
+        data = request.get_json(silent=True) or {}
         status = data.get('status')
         
         order = Order.query.get_or_404(order_id)
@@ -188,33 +228,95 @@ def create_app():
         if order.restaurant_id != session['restaurant_id']:
             return jsonify({'success': False, 'message': 'Unauthorized'}), 403
         
+        if status not in ORDER_STATUSES:
+            return jsonify({'success': False, 'message': 'Invalid status'}), 400
+        
+        # Log the transition in the same transaction as the status change
+        if status != order.status:
+            interval = record_transition(order, order.status, status)
+            if interval:
+                entered_at, left_at = interval
+                task_queue.enqueue_after_commit(db.session, record_status_duration, order.restaurant_id, order.id,
+                                                order.status, entered_at.isoformat(), left_at.isoformat())
+        
         order.status = status
         db.session.commit()
         
+        # Keep the active-order board in step, evicting completed/cancelled orders
+        if not order_board.set_status(order.restaurant_id, order.id, order.status):
+            order_board.refresh(order.id)
+        
         # Emit a socket event to update clients
-        order_data = {
-            'id': order.id,
-            'status': order.status,
-            'table_number': order.table.table_number
-        }
+        order_data = order_event_payload(order.id)
         socketio.emit('order_update', order_data)
         
         return jsonify({'success': True, 'order': order_data})
     
     # Customer-facing menu route
     @app.route('/menu')
+    @replica_read
     def view_menu():
         restaurant_id = request.args.get('rid')
         table_id = request.args.get('tid')
         
+        # The service worker caches this item-less shell and fills it from its menu snapshot
+        if restaurant_id and request.args.get('shell') == '1':
+            restaurant = Restaurant.query.get_or_404(restaurant_id)
+            return render_template('menu.html', restaurant=restaurant, table_id='', categories=[],
+                                   menu_version='')
+        
         if not restaurant_id or not table_id:
             return redirect(url_for('home'))
         
         restaurant = Restaurant.query.get_or_404(restaurant_id)
         table = Table.query.get_or_404(table_id)
-        menu_items = MenuItem.query.filter_by(restaurant_id=restaurant_id).all()
+        categories = menu_index.categories(restaurant.id)
         
-        return render_template('menu.html', restaurant=restaurant, table_id=table_id, menu_items=menu_items)
+        return render_template('menu.html', restaurant=restaurant, table_id=table_id, categories=categories,
+                               menu_version=menu_version(restaurant.id))
+
+    # Versioned menu API: full snapshot, or only the changes since a client's version
+    @app.route('/api/menu')
+    @replica_read
+    def get_menu():
+        restaurant_id = request.args.get('rid', type=int)
+        if not restaurant_id:
+            return jsonify({'success': False, 'message': 'Missing restaurant id'}), 400
+        
+        Restaurant.query.get_or_404(restaurant_id)
+        since = request.args.get('since', type=int)
+        snapshot = menu_snapshot(restaurant_id, since)
+        
+        response = jsonify(snapshot)
+        if snapshot['full']:
+            response.set_etag(f"menu-{restaurant_id}-{snapshot['version']}")
+        else:
+            response.set_etag(f"menu-{restaurant_id}-{since}-{snapshot['version']}")
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+
+    # Service worker that keeps an offline copy of the menu; served from the root for scope
+    @app.route('/menu-sw.js')
+    def menu_service_worker():
+        response = send_from_directory(os.path.join(app.static_folder, 'js'), 'menu-sw.js', max_age=0)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    # API endpoint to search a restaurant's menu
+    @app.route('/api/menu/search')
+    @replica_read
+    def search_menu():
+        restaurant_id = request.args.get('rid', type=int)
+        if not restaurant_id:
+            return jsonify({'success': False, 'message': 'Missing restaurant id'}), 400
+        
+        Restaurant.query.get_or_404(restaurant_id)
+        query = request.args.get('q', '')
+        categories = request.args.getlist('category') or None
+        limit = max(1, min(request.args.get('limit', 50, type=int), 200))
+        
+        results = menu_index.search(restaurant_id, query, categories=categories, limit=limit)
+        return jsonify({'success': True, 'results': results})
 
 
     # Add menu item route
@@ -250,6 +352,7 @@ def create_app():
             
             db.session.add(new_item)
             db.session.commit()
+            menu_index.upsert(new_item)
             
             flash('Menu item added successfully', 'success')
             return redirect(url_for('admin_menu'))
@@ -292,6 +395,7 @@ def create_app():
                 menu_item.image_url = url_for('static', filename=f'uploads/{filename}')
             
             db.session.commit()
+            menu_index.upsert(menu_item)
             
             flash('Menu item updated successfully', 'success')
             return redirect(url_for('admin_menu'))
@@ -314,8 +418,10 @@ def create_app():
                 return redirect(url_for('admin_menu'))
             
             # Delete the menu item
+            restaurant_id = menu_item.restaurant_id
             db.session.delete(menu_item)
             db.session.commit()
+            menu_index.remove(restaurant_id, item_id)
             
             flash('Menu item deleted successfully', 'success')
             return redirect(url_for('admin_menu'))
@@ -340,6 +446,7 @@ def create_app():
         # Update the availability
         menu_item.is_available = is_available
         db.session.commit()
+        menu_index.upsert(menu_item)
         
         return jsonify({'success': True}) 
     
@@ -455,8 +562,48 @@ def create_app():
 
 
 
+    # Task queue metrics
+    @app.route('/api/metrics/tasks')
+    @login_required
+    def task_metrics():
+        return jsonify(task_queue.metrics())
+    
+    # Rate limiting and load shedding metrics
+    @app.route('/api/metrics/admission')
+    @login_required
+    def admission_metrics():
+        return jsonify(admission.metrics())
+    
+    # Bulk import route for menu items and tables (CSV or JSON)
+    @app.route('/admin/import', methods=['POST'])
+    @login_required
+    def admin_import():
+        kind = request.form.get('kind')
+        dry_run = request.form.get('dry_run', '').lower() in ('1', 'true', 'yes', 'on')
+        upload = request.files.get('file')
+        
+        if not upload or not upload.filename:
+            return jsonify({'success': False, 'message': 'No file uploaded'}), 400
+        
+        fmt = request.form.get('format') or os.path.splitext(upload.filename)[1].lstrip('.').lower()
+        try:
+            text = upload.read().decode('utf-8-sig')
+        except UnicodeDecodeError:
+            return jsonify({'success': False, 'errors': ['File must be UTF-8 encoded']}), 400
+        
+        try:
+            plan = import_data(session['restaurant_id'], kind, text, fmt, dry_run=dry_run)
+        except ImportValidationError as e:
+            return jsonify({'success': False, 'errors': e.errors}), 400
+        
+        if kind == 'menu' and not dry_run:
+            menu_index.invalidate(session['restaurant_id'])
+        
+        return jsonify({'success': True, 'dry_run': dry_run, 'plan': plan})
+
     # Cart route
     @app.route('/cart')
+    @replica_read
     def view_cart():
         restaurant_id = request.args.get('rid')
         table_id = request.args.get('tid')
@@ -510,19 +657,42 @@ def create_app():
             )
             db.session.add(order_item)
         
-        db.session.commit()
+        record_transition(order, None, order.status)
         
-        # Emit a socket event for the new order
-        order_data = {
-            'id': order.id,
-            'status': order.status,
-            'table_number': order.table.table_number,
-            'restaurant_id': order.restaurant_id
-        }
-        socketio.emit('new_order', order_data)
+        # Once committed, board the order and emit a socket event; separate tasks so a
+        # failing broadcast can't keep the order off the kitchen's active list
+        task_queue.enqueue_after_commit(db.session, board_new_order, order.restaurant_id, order.id)
+        task_queue.enqueue_after_commit(db.session, broadcast_new_order, order.restaurant_id, order.id)
+        db.session.commit()
         
         return jsonify({'success': True, 'order_id': order.id})
     
+    # API endpoint for the estimated wait shown to customers
+    @app.route('/api/wait_time')
+    def wait_time():
+        restaurant_id = request.args.get('rid', type=int)
+        if not restaurant_id:
+            return jsonify({'success': False, 'message': 'Missing restaurant id'}), 400
+        
+        Restaurant.query.get_or_404(restaurant_id)
+        estimate = prep_time_stats.estimate_wait(restaurant_id)
+        if estimate is None:
+            return jsonify({'success': True, 'available': False})
+        
+        return jsonify({
+            'success': True,
+            'available': True,
+            'minutes': round(estimate['p50'] / 60),
+            'minutes_p90': round(estimate['p90'] / 60),
+            'samples': estimate['samples']
+        })
+    
+    # API endpoint for time-in-status percentiles (kitchen capacity planning)
+    @app.route('/api/prep_times')
+    @login_required
+    def prep_times():
+        return jsonify(prep_time_stats.percentiles(session['restaurant_id']))
+    
     # Order confirmation route
     @app.route('/confirmation')
     def order_confirmation():
@@ -530,7 +700,12 @@ def create_app():
         if not order_id:
             return redirect(url_for('home'))
         
-        order = Order.query.get_or_404(order_id)
+        # rid routes the lookup to the restaurant's shard; order ids are only unique per shard
+        restaurant_id = request.args.get('rid', type=int)
+        if restaurant_id is not None:
+            order = Order.query.filter_by(id=order_id, restaurant_id=restaurant_id).first_or_404()
+        else:
+            order = Order.query.get_or_404(order_id)
         restaurant = Restaurant.query.get(order.restaurant_id)
         
         return render_template('confirmation.html', order=order, restaurant=restaurant)
@@ -0,0 +1,105 @@
+"""Micro-benchmark for order serialization.
+
+Builds 1,000 orders with 3 items each in an in-memory SQLite database and
+compares the old ORM + hand-built dict + stdlib json path with the schema
+row-tuple path and the fast JSON backend.
+
+    python benchmarks/bench_serialization.py
+"""
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+os.environ.setdefault('TASK_QUEUE_WORKERS', '0')
+
+from app import create_app  # noqa: E402
+from extensions import db  # noqa: E402
+from models import Restaurant, MenuItem, Table, Order, OrderItem  # noqa: E402
+from order_board import load_order_payloads  # noqa: E402
+import serializers  # noqa: E402
+
+ORDERS = 1000
+ITEMS_PER_ORDER = 3
+ROUNDS = 5
+
+
+def seed():
+    restaurant = Restaurant(name='Bench', email='bench@example.com', password='x')
+    db.session.add(restaurant)
+    db.session.flush()
+    table = Table(table_number='1', restaurant_id=restaurant.id)
+    menu = [MenuItem(name=f'Item {i}', price=10 + i, restaurant_id=restaurant.id) for i in range(20)]
+    db.session.add(table)
+    db.session.add_all(menu)
+    db.session.flush()
+    for n in range(ORDERS):
+        order = Order(total_amount=100, table_id=table.id, restaurant_id=restaurant.id)
+        db.session.add(order)
+        db.session.flush()
+        for i in range(ITEMS_PER_ORDER):
+            db.session.add(OrderItem(quantity=1, price=10, order_id=order.id,
+                                     menu_item_id=menu[(n + i) % len(menu)].id))
+    db.session.commit()
+    return restaurant.id
+
+
+def orm_payload(restaurant_id):
+    # The shape get_orders used to build, one ORM object at a time
+    orders_list = []
+    for order in Order.query.filter_by(restaurant_id=restaurant_id).order_by(Order.created_at.desc()).all():
+        items = []
+        for item in order.order_items:
+            menu_item = db.session.get(MenuItem, item.menu_item_id)
+            items.append({
+                'id': item.id,
+                'name': menu_item.name,
+                'quantity': item.quantity,
+                'price': item.price,
+                'special_instructions': item.special_instructions
+            })
+        orders_list.append({
+            'id': order.id,
+            'table_number': order.table.table_number,
+            'status': order.status,
+            'total_amount': order.total_amount,
+            'created_at': order.created_at.isoformat(),
+            'items': items
+        })
+    return json.dumps(orders_list)
+
+
+def schema_payload(restaurant_id):
+    return serializers.dumps(load_order_payloads(Order.restaurant_id == restaurant_id))
+
+
+def bench(name, fn):
+    timings = []
+    for _ in range(ROUNDS):
+        db.session.expunge_all()
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    best = min(timings)
+    print(f'{name:<34} {best * 1000:8.1f} ms   {ORDERS / best:10,.0f} orders/s')
+
+
+def main():
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        restaurant_id = seed()
+        payload = load_order_payloads(Order.restaurant_id == restaurant_id)
+
+        backend = 'orjson' if serializers.orjson is not None else 'stdlib json (orjson not installed)'
+        print(f'{ORDERS} orders x {ITEMS_PER_ORDER} items, best of {ROUNDS}, fast backend: {backend}')
+        bench('ORM objects + json.dumps', lambda: orm_payload(restaurant_id))
+        bench('schema rows + serializers.dumps', lambda: schema_payload(restaurant_id))
+        bench('encode only: json.dumps', lambda: json.dumps(payload))
+        bench('encode only: serializers.dumps', lambda: serializers.dumps(payload))
+
+
+if __name__ == '__main__':
+    main()
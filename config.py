@@ -16,8 +16,57 @@ SQLALCHEMY_DATABASE_URI = os.environ.get(
 
 SQLALCHEMY_TRACK_MODIFICATIONS = False 
 
+# Optional read replicas (comma separated URLs). Read-only GET routes use them;
+# writes and clients that wrote in the last REPLICA_STICKY_SECONDS use the primary.
+# DATABASE_REPLICA_URLS=sqlite:///replica.db
+SQLALCHEMY_BINDS = {
+    f'replica_{i}': url.strip()
+    for i, url in enumerate(os.environ.get('DATABASE_REPLICA_URLS', '').split(','))
+    if url.strip()
+}
+REPLICA_STICKY_SECONDS = float(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+
+# Optional tenant shards ("<name>=<url>", comma separated). The shard_assignment table
+# on the default database maps each restaurant to a shard; unassigned restaurants stay
+# on the default database. Shard lookups are cached for SHARD_MAP_TTL seconds.
+# DATABASE_SHARDS=east=sqlite:///shard_east.db,west=sqlite:///shard_west.db
+SQLALCHEMY_BINDS.update({
+    f'shard_{name.strip()}': url.strip()
+    for name, _, url in (pair.partition('=') for pair in os.environ.get('DATABASE_SHARDS', '').split(','))
+    if name.strip() and url.strip()
+})
+SHARD_MAP_TTL = float(os.environ.get('SHARD_MAP_TTL', 5))
+# At most this many cached lookups, dropping the least recently used
+SHARD_MAP_MAX_ENTRIES = int(os.environ.get('SHARD_MAP_MAX_ENTRIES', 100000))
+# Row ids each shard may hand out; ids stay unique across shards so moves keep them
+SHARD_ID_RANGE_SIZE = int(os.environ.get('SHARD_ID_RANGE_SIZE', 100_000_000))
+
 # Razorpay Configuration (for payment processing)
 # IMPORTANT: Set these as environment variables in production!
 # For testing, you can use Razorpay test keys
 RAZORPAY_KEY_ID = os.environ.get('RAZORPAY_KEY_ID', 'your_razorpay_test_key_id')
-RAZORPAY_KEY_SECRET = os.environ.get('RAZORPAY_KEY_SECRET', 'your_razorpay_test_key_secret')    
\ No newline at end of file
+RAZORPAY_KEY_SECRET = os.environ.get('RAZORPAY_KEY_SECRET', 'your_razorpay_test_key_secret')
+
+# Background task queue for post-commit work (socket broadcasts, receipts, ...)
+# Set TASK_QUEUE_WORKERS=0 to run tasks inline right after commit
+TASK_QUEUE_BACKEND = os.environ.get('TASK_QUEUE_BACKEND', 'local')
+TASK_QUEUE_WORKERS = int(os.environ.get('TASK_QUEUE_WORKERS', 2))
+TASK_QUEUE_MAX_RETRIES = int(os.environ.get('TASK_QUEUE_MAX_RETRIES', 3))
+TASK_QUEUE_RETRY_DELAY = float(os.environ.get('TASK_QUEUE_RETRY_DELAY', 0.5))
+
+# Admission control for public customer endpoints
+# Limits are "<requests>/<seconds>:<burst>" token buckets per client IP and per restaurant.
+# Use RATELIMIT_STORAGE_URL=redis://... to share buckets between worker processes.
+ADMISSION_CONTROL_ENABLED = os.environ.get('ADMISSION_CONTROL_ENABLED', '1') != '0'
+RATELIMIT_STORAGE_URL = os.environ.get('RATELIMIT_STORAGE_URL', 'memory://')
+RATELIMIT_PER_IP = os.environ.get('RATELIMIT_PER_IP', '5/1:30')
+RATELIMIT_PER_RESTAURANT = os.environ.get('RATELIMIT_PER_RESTAURANT', '100/1:300')
+# Number of proxies (e.g. a load balancer) in front of the app whose X-Forwarded-For is
+# trusted for the client address; leave at 0 when clients connect directly
+RATELIMIT_TRUSTED_PROXIES = int(os.environ.get('RATELIMIT_TRUSTED_PROXIES', 0))
+# In-memory storage keeps at most this many buckets, dropping the least recently used
+RATELIMIT_MAX_BUCKETS = int(os.environ.get('RATELIMIT_MAX_BUCKETS', 100000))
+# Menu browsing is shed first once this many requests are in flight; orders and admin
+# routes keep being admitted up to MAX_CONCURRENT_REQUESTS
+MAX_CONCURRENT_REQUESTS = int(os.environ.get('MAX_CONCURRENT_REQUESTS', 200))
+MAX_CONCURRENT_BROWSE_REQUESTS = int(os.environ.get('MAX_CONCURRENT_BROWSE_REQUESTS', 150))
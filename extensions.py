@@ -1,5 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from routing import RoutingSession
 
-db = SQLAlchemy()
-migrate = Migrate()
\ No newline at end of file
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+migrate = Migrate()
@@ -0,0 +1,231 @@
+import csv
+import io
+import json
+
+import sqlalchemy as sa
+
+from extensions import db
+from models import MenuItem, Table
+from menu_sync import record_menu_reset
+from routing import check_writable
+from sharding import next_ids
+
+MENU_FIELDS = ('name', 'description', 'price', 'category', 'is_available', 'image_url')
+TRUE_VALUES = ('1', 'true', 'yes', 'y', 'on')
+# Key holding the rows when a JSON import wraps them in an object
+JSON_KEYS = {'menu': 'menu_items', 'tables': 'tables'}
+
+
+class ImportValidationError(ValueError):
+    """Raised when an import file has invalid rows; nothing is written."""
+
+    def __init__(self, errors):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+
+def parse_rows(text, fmt, kind=None):
+    """Parse CSV or JSON text into a list of dicts."""
+    if fmt == 'json':
+        try:
+            data = json.loads(text)
+        except ValueError as e:
+            raise ImportValidationError([f'Invalid JSON: {e}'])
+        if isinstance(data, dict):
+            # Accept {"menu_items": [...]} / {"tables": [...]} wrappers
+            key = JSON_KEYS.get(kind)
+            if key not in data:
+                raise ImportValidationError([f'JSON object must have a "{key}" list'])
+            data = data[key]
+        if not isinstance(data, list):
+            raise ImportValidationError(['JSON import must be a list of objects'])
+        return data
+    if fmt == 'csv':
+        reader = csv.DictReader(io.StringIO(text))
+        return [{k.strip(): (v.strip() if isinstance(v, str) else v)
+                 for k, v in row.items() if k} for row in reader]
+    raise ImportValidationError([f'Unsupported format: {fmt}'])
+
+
+def _to_bool(value, default=True):
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+def validate_menu_rows(rows):
+    errors = []
+    items = []
+    seen = set()
+    for line, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors.append(f'Row {line}: expected an object')
+            continue
+        name = str(row.get('name') or '').strip()
+        if not name:
+            errors.append(f'Row {line}: name is required')
+            continue
+        if name.lower() in seen:
+            errors.append(f'Row {line}: duplicate item "{name}"')
+            continue
+        seen.add(name.lower())
+        try:
+            price = float(row.get('price'))
+        except (TypeError, ValueError):
+            errors.append(f'Row {line}: invalid price {row.get("price")!r}')
+            continue
+        if price < 0:
+            errors.append(f'Row {line}: price must not be negative')
+            continue
+        items.append({
+            'name': name,
+            'description': row.get('description') or None,
+            'price': price,
+            'category': row.get('category') or None,
+            'is_available': _to_bool(row.get('is_available')),
+            'image_url': row.get('image_url') or None
+        })
+    return items, errors
+
+
+def _expand_table_numbers(value):
+    # "1-60" expands to a range of tables, anything else is a single table number
+    value = str(value).strip()
+    start, sep, end = value.partition('-')
+    if sep and start.strip().isdigit() and end.strip().isdigit():
+        start, end = int(start), int(end)
+        if start > end:
+            raise ValueError(f'invalid range {value!r}')
+        return [str(n) for n in range(start, end + 1)]
+    return [value]
+
+
+def validate_table_rows(rows):
+    errors = []
+    tables = []
+    seen = set()
+    for line, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors.append(f'Row {line}: expected an object')
+            continue
+        raw_number = row.get('table_number')
+        if raw_number is None or str(raw_number).strip() == '':
+            errors.append(f'Row {line}: table_number is required')
+            continue
+        try:
+            numbers = _expand_table_numbers(raw_number)
+            capacity = int(row.get('capacity') or 0)
+        except ValueError as e:
+            errors.append(f'Row {line}: {e}')
+            continue
+        for number in numbers:
+            if len(number) > 20:
+                errors.append(f'Row {line}: table number {number!r} is too long')
+            elif number in seen:
+                errors.append(f'Row {line}: duplicate table number {number}')
+            else:
+                seen.add(number)
+                tables.append({
+                    'table_number': number,
+                    'capacity': capacity,
+                    'location': row.get('location') or ''
+                })
+    return tables, errors
+
+
+def plan_menu_import(restaurant_id, items):
+    """Diff incoming menu items against the restaurant's menu, matching on name."""
+    existing = {
+        name.lower(): (item_id, dict(zip(MENU_FIELDS, values)))
+        for item_id, name, *values in db.session.query(
+            MenuItem.id, MenuItem.name, MenuItem.description, MenuItem.price,
+            MenuItem.category, MenuItem.is_available, MenuItem.image_url
+        ).filter(MenuItem.restaurant_id == restaurant_id)
+    }
+    plan = {'create': [], 'update': [], 'unchanged': []}
+    for item in items:
+        match = existing.get(item['name'].lower())
+        if match is None:
+            plan['create'].append(item)
+            continue
+        item_id, current = match
+        current['name'] = item['name']
+        if all(current[field] == item[field] for field in MENU_FIELDS):
+            plan['unchanged'].append(dict(item, id=item_id))
+        else:
+            plan['update'].append(dict(item, id=item_id))
+    return plan
+
+
+def plan_table_import(restaurant_id, tables):
+    """Diff incoming tables against existing ones with a single set-based query."""
+    numbers = [t['table_number'] for t in tables]
+    existing = {}
+    if numbers:
+        existing = {
+            number: (table_id, capacity, location)
+            for table_id, number, capacity, location in db.session.query(
+                Table.id, Table.table_number, Table.capacity, Table.location
+            ).filter(Table.restaurant_id == restaurant_id, Table.table_number.in_(numbers))
+        }
+    plan = {'create': [], 'update': [], 'unchanged': []}
+    for table in tables:
+        match = existing.get(table['table_number'])
+        if match is None:
+            plan['create'].append(table)
+            continue
+        table_id, capacity, location = match
+        if (capacity or 0, location or '') == (table['capacity'], table['location']):
+            plan['unchanged'].append(dict(table, id=table_id))
+        else:
+            plan['update'].append(dict(table, id=table_id))
+    return plan
+
+
+def apply_plan(model, restaurant_id, plan):
+    """Write a plan in one transaction using bulk inserts and updates."""
+    # Bulk writes skip the flush-time freeze check; rows written mid-move would be purged
+    check_writable(db.session)
+    try:
+        if plan['create']:
+            rows = [dict(row, restaurant_id=restaurant_id) for row in plan['create']]
+            # Bulk inserts skip mapper events, so take ids from the shard's range here
+            ids = next_ids(db.session.connection(bind_arguments={'mapper': sa.inspect(model)}),
+                           model.__table__, len(rows))
+            for row, row_id in zip(rows, ids or ()):
+                row['id'] = row_id
+            db.session.bulk_insert_mappings(model, rows)
+        if plan['update']:
+            db.session.bulk_update_mappings(model, plan['update'])
+        if model is MenuItem and (plan['create'] or plan['update']):
+            record_menu_reset(restaurant_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def import_data(restaurant_id, kind, text, fmt, dry_run=False):
+    """Validate, diff and (unless dry_run) write an import file.
+
+    Returns the plan as a dict of create/update/unchanged lists.
+    """
+    if kind not in JSON_KEYS:
+        raise ImportValidationError([f'Unknown import kind: {kind}'])
+    rows = parse_rows(text, fmt, kind)
+    if kind == 'menu':
+        records, errors = validate_menu_rows(rows)
+        model, planner = MenuItem, plan_menu_import
+    elif kind == 'tables':
+        records, errors = validate_table_rows(rows)
+        model, planner = Table, plan_table_import
+
+    if errors:
+        raise ImportValidationError(errors)
+
+    plan = planner(restaurant_id, records)
+    if not dry_run:
+        apply_plan(model, restaurant_id, plan)
+    return plan
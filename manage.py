@@ -1,7 +1,96 @@
+import json
+import os
+
+import click
+
 from app import create_app
 from extensions import db, migrate
+from importer import import_data, ImportValidationError
+from routing import replica_bind_keys, restaurant_scope, shard_names, simulate_replication
+from sharding import (ShardMoveError, backfill_directory, create_shard_schemas, move_restaurant,
+                      register_id_ranges)
 
 app = create_app()
 
+
+@app.cli.command('import-data')
+@click.argument('restaurant_id', type=int)
+@click.argument('kind', type=click.Choice(['menu', 'tables']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'json']), help='Defaults to the file extension.')
+@click.option('--dry-run', is_flag=True, help='Show what would change without writing anything.')
+def import_data_command(restaurant_id, kind, path, fmt, dry_run):
+    """Bulk import menu items or tables for a restaurant from CSV/JSON."""
+    fmt = fmt or os.path.splitext(path)[1].lstrip('.').lower()
+    try:
+        with open(path, encoding='utf-8-sig') as f:
+            text = f.read()
+    except UnicodeDecodeError:
+        click.echo('error: File must be UTF-8 encoded', err=True)
+        raise SystemExit(1)
+
+    try:
+        with restaurant_scope(restaurant_id):
+            plan = import_data(restaurant_id, kind, text, fmt, dry_run=dry_run)
+    except ImportValidationError as e:
+        for error in e.errors:
+            click.echo(f'error: {error}', err=True)
+        raise SystemExit(1)
+
+    for action in ('create', 'update', 'unchanged'):
+        click.echo(f'{action}: {len(plan[action])}')
+    if dry_run:
+        click.echo(json.dumps(plan, indent=2))
+        click.echo('Dry run, nothing written.')
+
+
+
+@app.cli.command('simulate-replica')
+@click.option('--lag', default=2.0, show_default=True, help='Seconds between replica refreshes.')
+@click.option('--iterations', type=int, help='Stop after this many refreshes.')
+def simulate_replica_command(lag, iterations):
+    """Copy the primary SQLite database to the replica files with a delay."""
+    engines = db.engines
+    targets = [engines[key].url.render_as_string(hide_password=False) for key in replica_bind_keys(engines)]
+    if not targets:
+        click.echo('No replicas configured, set DATABASE_REPLICA_URLS.', err=True)
+        raise SystemExit(1)
+    click.echo(f'Replicating {engines[None].url} to {len(targets)} replica(s) every {lag}s')
+    simulate_replication(engines[None].url.render_as_string(hide_password=False), targets, lag, iterations)
+
+
+@app.cli.command('init-shards')
+def init_shards_command():
+    """Create the schema on every shard and add existing restaurants to the directory."""
+    ranges = register_id_ranges()
+    create_shard_schemas()
+    added = backfill_directory()
+    for shard in shard_names(db.engines):
+        click.echo(f'Shard {shard}: ids from {ranges[shard]}')
+    click.echo(f'Added {added} restaurant(s) to the shard directory')
+
+
+@app.cli.command('move-restaurant')
+@click.argument('restaurant_id', type=int)
+@click.argument('shard')
+@click.option('--settle', type=float, help='Seconds to wait for shard map caches to expire. '
+                                           'Defaults to SHARD_MAP_TTL + 1.')
+def move_restaurant_command(restaurant_id, shard, settle):
+    """Move a restaurant's rows to another shard while it keeps serving.
+
+    Writes for the restaurant are rejected for a few seconds while the last
+    changes are copied; reads keep working throughout.
+    """
+    try:
+        result = move_restaurant(restaurant_id, shard, settle=settle)
+    except ShardMoveError as e:
+        click.echo(f'error: {e}', err=True)
+        raise SystemExit(1)
+
+    click.echo(f"Moved restaurant {restaurant_id} from {result['source']} to {result['target']}")
+    for phase in ('copied', 'delta', 'purged'):
+        click.echo(f'{phase}: {sum(result[phase].values())} row(s)')
+
+
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=True)
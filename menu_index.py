@@ -0,0 +1,177 @@
+import re
+import threading
+from bisect import bisect_left
+from difflib import get_close_matches
+
+from models import MenuItem
+from routing import primary
+from serializers import MENU_ITEM
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return TOKEN_RE.findall(text.lower())
+
+
+def item_to_dict(item):
+    return MENU_ITEM.dump_object(item)
+
+
+class RestaurantMenu:
+    """Inverted index over one restaurant's menu items."""
+
+    def __init__(self):
+        self.items = {}         # item id -> item dict
+        self.postings = {}      # token -> set of item ids
+        self.item_tokens = {}   # item id -> set of tokens
+        self.version = 0
+        self._sorted_tokens = None
+        self._categories = None
+        self._categories_version = -1
+
+    def upsert(self, data):
+        self._unindex(data['id'])
+        tokens = set()
+        for field in ('name', 'description', 'category'):
+            tokens.update(tokenize(data.get(field)))
+        for token in tokens:
+            self.postings.setdefault(token, set()).add(data['id'])
+        self.items[data['id']] = data
+        self.item_tokens[data['id']] = tokens
+        self._touch()
+
+    def remove(self, item_id):
+        if item_id in self.items:
+            self._unindex(item_id)
+            del self.items[item_id]
+            self._touch()
+
+    def _unindex(self, item_id):
+        for token in self.item_tokens.pop(item_id, ()):
+            ids = self.postings.get(token)
+            if ids is None:
+                continue
+            ids.discard(item_id)
+            if not ids:
+                del self.postings[token]
+
+    def _touch(self):
+        self.version += 1
+        self._sorted_tokens = None
+
+    def sorted_tokens(self):
+        if self._sorted_tokens is None:
+            self._sorted_tokens = sorted(self.postings)
+        return self._sorted_tokens
+
+    def categories(self):
+        # Grouping is computed once per menu version and reused for every render
+        if self._categories_version != self.version:
+            groups = {}
+            for item in sorted(self.items.values(), key=lambda i: i['id']):
+                bucket = groups.setdefault(item['category'], [])
+                if item['is_available']:
+                    bucket.append(item)
+            self._categories = list(groups.items())
+            self._categories_version = self.version
+        return self._categories
+
+    def match_token(self, query_token):
+        tokens = self.sorted_tokens()
+        matched = set()
+        # Prefix match over the sorted token list
+        pos = bisect_left(tokens, query_token)
+        while pos < len(tokens) and tokens[pos].startswith(query_token):
+            matched.update(self.postings[tokens[pos]])
+            pos += 1
+        # Fall back to fuzzy matching for typos
+        if not matched:
+            for token in get_close_matches(query_token, tokens, n=5, cutoff=0.75):
+                matched.update(self.postings[token])
+        return matched
+
+    def search(self, query, categories=None, available_only=True, limit=50):
+        query_tokens = tokenize(query)
+        if query_tokens:
+            ids = None
+            for token in query_tokens:
+                matched = self.match_token(token)
+                ids = matched if ids is None else ids & matched
+                if not ids:
+                    return []
+        else:
+            ids = set(self.items)
+
+        results = []
+        for item_id in ids:
+            item = self.items[item_id]
+            if available_only and not item['is_available']:
+                continue
+            if categories and item['category'] not in categories:
+                continue
+            results.append(item)
+
+        # Exact token hits rank above prefix or fuzzy hits
+        def rank(item):
+            exact = sum(1 for t in query_tokens if t in self.item_tokens[item['id']])
+            return (-exact, item['name'].lower())
+
+        results.sort(key=rank)
+        return results[:limit]
+
+
+class MenuIndex:
+    """Per-restaurant in-memory menu indexes, loaded lazily from the database."""
+
+    def __init__(self):
+        self._menus = {}
+        self._lock = threading.RLock()
+
+    def clear(self):
+        with self._lock:
+            self._menus.clear()
+
+    def get(self, restaurant_id):
+        restaurant_id = int(restaurant_id)
+        with self._lock:
+            menu = self._menus.get(restaurant_id)
+            if menu is None:
+                menu = RestaurantMenu()
+                # Load from the primary so a lagging replica never seeds a stale index
+                with primary():
+                    rows = (MenuItem.query.with_entities(*MENU_ITEM.columns)
+                            .filter_by(restaurant_id=restaurant_id).all())
+                for item in MENU_ITEM.dump_many(rows):
+                    menu.upsert(item)
+                self._menus[restaurant_id] = menu
+            return menu
+
+    def invalidate(self, restaurant_id):
+        # Drop a restaurant's index so it is rebuilt from the database on next access
+        with self._lock:
+            self._menus.pop(int(restaurant_id), None)
+
+    def upsert(self, item):
+        with self._lock:
+            if int(item.restaurant_id) in self._menus:
+                self._menus[int(item.restaurant_id)].upsert(item_to_dict(item))
+
+    def remove(self, restaurant_id, item_id):
+        with self._lock:
+            menu = self._menus.get(int(restaurant_id))
+            if menu is not None:
+                menu.remove(int(item_id))
+
+    def categories(self, restaurant_id):
+        with self._lock:
+            return self.get(restaurant_id).categories()
+
+    def search(self, restaurant_id, query, categories=None, limit=50):
+        with self._lock:
+            return self.get(restaurant_id).search(query, categories=categories, limit=limit)
+
+
+menu_index = MenuIndex()
@@ -0,0 +1,91 @@
+from datetime import datetime
+
+from sqlalchemy import event, func
+
+from extensions import db
+from models import MenuItem, MenuChange
+from serializers import MENU_ITEM
+from sharding import next_ids
+
+
+def _log_change(connection, target, op):
+    changes = MenuChange.__table__
+    values = {
+        'restaurant_id': target.restaurant_id,
+        'menu_item_id': target.id,
+        'op': op,
+        'created_at': datetime.utcnow()
+    }
+    ids = next_ids(connection, changes)
+    if ids:
+        values['id'] = ids[0]
+    connection.execute(changes.insert().values(values))
+
+
+# Every ORM write to a menu item is logged in the same transaction
+@event.listens_for(MenuItem, 'after_insert')
+def _menu_item_inserted(mapper, connection, target):
+    _log_change(connection, target, 'upsert')
+
+
+@event.listens_for(MenuItem, 'after_update')
+def _menu_item_updated(mapper, connection, target):
+    _log_change(connection, target, 'upsert')
+
+
+@event.listens_for(MenuItem, 'after_delete')
+def _menu_item_deleted(mapper, connection, target):
+    _log_change(connection, target, 'delete')
+
+
+def record_menu_reset(restaurant_id):
+    """Log a change that forces clients to refetch the whole menu.
+
+    Bulk writes bypass the mapper events above, so they call this instead.
+    """
+    db.session.add(MenuChange(restaurant_id=restaurant_id, op='reset'))
+
+
+def menu_version(restaurant_id):
+    return db.session.query(func.max(MenuChange.id)).filter(
+        MenuChange.restaurant_id == restaurant_id).scalar() or 0
+
+
+def menu_snapshot(restaurant_id, since=None):
+    """Return the full menu, or only the changes after version ``since``.
+
+    The version is read before the items, so a concurrent write can only
+    make the payload newer than its version, never older.
+    """
+    version = menu_version(restaurant_id)
+    payload = {'restaurant_id': restaurant_id, 'version': version, 'full': True,
+               'items': [], 'deleted': []}
+
+    if since and 0 < since <= version:
+        changes = (db.session.query(MenuChange.menu_item_id, MenuChange.op)
+                   .filter(MenuChange.restaurant_id == restaurant_id,
+                           MenuChange.id > since, MenuChange.id <= version)
+                   .all())
+        if not any(op == 'reset' for _, op in changes):
+            changed_ids = {item_id for item_id, _ in changes}
+            items = []
+            if changed_ids:
+                items = MENU_ITEM.dump_many(
+                    db.session.query(*MENU_ITEM.columns)
+                    .filter(MenuItem.restaurant_id == restaurant_id, MenuItem.id.in_(changed_ids))
+                    .order_by(MenuItem.id)
+                )
+            payload.update({
+                'full': False,
+                'since': since,
+                'items': items,
+                'deleted': sorted(changed_ids - {item['id'] for item in items})
+            })
+            return payload
+
+    payload['items'] = MENU_ITEM.dump_many(
+        db.session.query(*MENU_ITEM.columns)
+        .filter(MenuItem.restaurant_id == restaurant_id)
+        .order_by(MenuItem.id)
+    )
+    return payload
@@ -48,6 +48,7 @@ class Order(db.Model):
     restaurant_id = db.Column(db.Integer, db.ForeignKey('restaurant.id'), nullable=False)
     
     order_items = db.relationship('OrderItem', backref='order', lazy=True)
+    status_events = db.relationship('OrderStatusEvent', backref='order', lazy=True)
 
 class OrderItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -55,4 +56,39 @@ class OrderItem(db.Model):
     price = db.Column(db.Float, nullable=False) # Price at the time of order
     special_instructions = db.Column(db.Text)
     order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
-    menu_item_id = db.Column(db.Integer, db.ForeignKey('menu_item.id'), nullable=False)
\ No newline at end of file
+    menu_item_id = db.Column(db.Integer, db.ForeignKey('menu_item.id'), nullable=False)
+
+class OrderStatusEvent(db.Model):
+    # Append-only log of order status transitions
+    id = db.Column(db.Integer, primary_key=True)
+    from_status = db.Column(db.String(20))  # None for the order's first status
+    to_status = db.Column(db.String(20), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
+    restaurant_id = db.Column(db.Integer, db.ForeignKey('restaurant.id'), nullable=False, index=True)
+
+class MenuChange(db.Model):
+    # Change log for menu items; the latest id for a restaurant is its menu version
+    id = db.Column(db.Integer, primary_key=True)
+    restaurant_id = db.Column(db.Integer, db.ForeignKey('restaurant.id'), nullable=False, index=True)
+    menu_item_id = db.Column(db.Integer)  # No FK, deleted items keep their change rows
+    op = db.Column(db.String(10), nullable=False)  # upsert, delete, reset
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ShardAssignment(db.Model):
+    # Directory of which database holds each restaurant's rows; always on the default database.
+    # Restaurant ids are allocated here so they stay unique across shards.
+    restaurant_id = db.Column(db.Integer, primary_key=True)
+    email = db.Column(db.String(100), unique=True, nullable=False)  # Login looks the shard up by email
+    shard = db.Column(db.String(50), nullable=False, default='default')
+    status = db.Column(db.String(20), nullable=False, default='active')  # active, moving
+
+class ShardIdRange(db.Model):
+    # Each shard numbers new rows from its own id range, so rows keep their ids when moved
+    shard = db.Column(db.String(50), primary_key=True)
+    first_id = db.Column(db.Integer, nullable=False, unique=True)
+
+class ShardIdCounter(db.Model):
+    # Next id each table hands out on this shard (inside its range); lives on every shard, never moved
+    table_name = db.Column(db.String(50), primary_key=True)
+    next_id = db.Column(db.Integer, nullable=False)
@@ -0,0 +1,160 @@
+import threading
+
+from sqlalchemy import inspect
+
+from extensions import db
+from models import Restaurant, MenuItem, Table, Order, OrderItem
+from routing import each_shard, primary, shard_bind_key
+from serializers import ORDER, ORDER_EVENT, ORDER_ITEM, dumps
+
+ACTIVE_STATUSES = ('pending', 'preparing', 'ready')
+ORDER_STATUSES = ACTIVE_STATUSES + ('completed', 'cancelled')
+
+
+def load_order_payloads(*criteria):
+    """Build dashboard payloads for matching orders, newest first, in two queries."""
+    orders = ORDER.dump_many(
+        db.session.query(*ORDER.columns)
+        .join(Table, Order.table_id == Table.id)
+        .filter(*criteria)
+        .order_by(Order.created_at.desc(), Order.id.desc())
+    )
+    if not orders:
+        return []
+
+    items_by_order = {order['id']: [] for order in orders}
+    item_rows = (db.session.query(*ORDER_ITEM.columns)
+                 .join(MenuItem, OrderItem.menu_item_id == MenuItem.id)
+                 .filter(OrderItem.order_id.in_(list(items_by_order)))
+                 .order_by(OrderItem.id))
+    for item in ORDER_ITEM.dump_many(item_rows):
+        items_by_order[item.pop('order_id')].append(item)
+
+    for order in orders:
+        order['items'] = items_by_order[order['id']]
+    return orders
+
+
+def order_event_payload(order_id):
+    """Compact order payload for Socket.IO events."""
+    row = (db.session.query(*ORDER_EVENT.columns)
+           .join(Table, Order.table_id == Table.id)
+           .filter(Order.id == order_id)
+           .one())
+    return ORDER_EVENT.dump(row)
+
+
+class ActiveOrderBoard:
+    """Per-restaurant in-process store of pending/preparing/ready orders.
+
+    Each order is kept as pre-encoded JSON so /api/orders can be served by
+    joining strings. The board only sees writes made by this process.
+    """
+
+    def __init__(self):
+        self._orders = {}       # restaurant id -> {order id: (payload, encoded)}
+        self._responses = {}    # (restaurant id, status) -> encoded list
+        self._lock = threading.RLock()
+
+    def clear(self):
+        with self._lock:
+            self._orders.clear()
+            self._responses.clear()
+
+    def warm(self):
+        """Load every restaurant's active orders from every shard; called once at startup."""
+        restaurant_ids, payloads = [], []
+        with primary():
+            for shard in each_shard():
+                if not inspect(db.engines[shard_bind_key(shard)]).has_table(Order.__tablename__):
+                    continue
+                restaurant_ids.extend(rid for rid, in db.session.query(Restaurant.id))
+                payloads.extend(load_order_payloads(Order.status.in_(ACTIVE_STATUSES)))
+        with self._lock:
+            self.clear()
+            for restaurant_id in restaurant_ids:
+                self._orders[restaurant_id] = {}
+            for payload in payloads:
+                self._store(payload)
+
+    def _load(self, restaurant_id):
+        # Cache miss: read this restaurant's active orders from the database
+        with primary():
+            payloads = load_order_payloads(Order.restaurant_id == restaurant_id,
+                                           Order.status.in_(ACTIVE_STATUSES))
+        self._orders[restaurant_id] = {}
+        for payload in payloads:
+            self._store(payload)
+
+    def _store(self, payload):
+        orders = self._orders.setdefault(payload['restaurant_id'], {})
+        if payload['status'] in ACTIVE_STATUSES:
+            orders[payload['id']] = (payload, dumps(payload))
+        else:
+            orders.pop(payload['id'], None)
+        self._invalidate(payload['restaurant_id'])
+
+    def _invalidate(self, restaurant_id):
+        for key in [key for key in self._responses if key[0] == restaurant_id]:
+            del self._responses[key]
+
+    def update(self, payload):
+        """Add, refresh or evict an order from a full dashboard payload."""
+        with self._lock:
+            if payload['restaurant_id'] in self._orders:
+                self._store(payload)
+
+    def set_status(self, restaurant_id, order_id, status):
+        with self._lock:
+            orders = self._orders.get(restaurant_id)
+            if orders is None or order_id not in orders:
+                return False
+            payload = dict(orders[order_id][0], status=status)
+            self._store(payload)
+            return True
+
+    def refresh(self, order_id):
+        """Reload one order from the database and store or evict it."""
+        with primary():
+            payloads = load_order_payloads(Order.id == order_id)
+        for payload in payloads:
+            self.update(payload)
+
+    def orders_json(self, restaurant_id, status='active'):
+        """Return the JSON list of active orders, newest first."""
+        key = (restaurant_id, status)
+        with self._lock:
+            if restaurant_id not in self._orders:
+                self._load(restaurant_id)
+            response = self._responses.get(key)
+            if response is None:
+                entries = sorted(self._orders[restaurant_id].values(),
+                                 key=lambda entry: (entry[0]['created_at'], entry[0]['id']), reverse=True)
+                response = '[' + ','.join(encoded for payload, encoded in entries
+                                          if status == 'active' or payload['status'] == status) + ']'
+                self._responses[key] = response
+            return response
+
+    def check(self, restaurant_id, repair=False):
+        """Compare the board with the database and report differences."""
+        with primary():
+            expected = {order_id: status for order_id, status in db.session.query(Order.id, Order.status)
+                        .filter(Order.restaurant_id == restaurant_id, Order.status.in_(ACTIVE_STATUSES))}
+        with self._lock:
+            if restaurant_id not in self._orders:
+                self._load(restaurant_id)
+            actual = {order_id: entry[0]['status'] for order_id, entry in self._orders[restaurant_id].items()}
+            report = {
+                'missing': sorted(set(expected) - set(actual)),
+                'extra': sorted(set(actual) - set(expected)),
+                'stale': sorted(order_id for order_id in set(expected) & set(actual)
+                                if expected[order_id] != actual[order_id])
+            }
+            report['consistent'] = not (report['missing'] or report['extra'] or report['stale'])
+            if repair and not report['consistent']:
+                self._load(restaurant_id)
+                self._invalidate(restaurant_id)
+        return report
+
+
+order_board = ActiveOrderBoard()
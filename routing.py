@@ -0,0 +1,330 @@
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+
+import sqlalchemy as sa
+from flask import current_app, jsonify, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+from admission import PUBLIC_ENDPOINTS
+
+REPLICA_PREFIX = 'replica_'
+USE_REPLICA = 'use_replica'
+REPLICA = 'replica'
+FORCE_PRIMARY = 'force_primary'
+WROTE = 'wrote'
+
+SHARD_PREFIX = 'shard_'
+DEFAULT_SHARD = 'default'
+SHARD = 'shard'
+FROZEN = 'shard_frozen'
+# Tables that always live in the default database, whichever shard a request is on
+DIRECTORY_TABLES = {'shard_assignment', 'shard_id_range'}
+
+_assignments = sa.table('shard_assignment', sa.column('restaurant_id'), sa.column('shard'), sa.column('status'))
+_id_ranges = sa.table('shard_id_range', sa.column('shard'), sa.column('first_id'))
+
+
+class ShardMovingError(Exception):
+    """Raised when a restaurant is written to while its rows move between shards."""
+
+
+def replica_bind_keys(engines):
+    return [key for key in engines if key and key.startswith(REPLICA_PREFIX)]
+
+
+def shard_names(engines):
+    return [DEFAULT_SHARD] + [key[len(SHARD_PREFIX):] for key in engines
+                              if key and key.startswith(SHARD_PREFIX)]
+
+
+def shard_bind_key(shard):
+    return None if shard == DEFAULT_SHARD else SHARD_PREFIX + shard
+
+
+def shard_for_engine(engines, engine):
+    for shard in shard_names(engines):
+        if engines[shard_bind_key(shard)] is engine:
+            return shard
+    return None
+
+
+class ShardMap:
+    """Cached restaurant_id -> (shard, status) lookups against the directory table.
+
+    Entries expire after ``ttl`` seconds, so a move only has to wait that long
+    for every process to see a restaurant frozen or pointed at its new shard.
+    Restaurants without a directory row live on the default database. At
+    most ``max_entries`` lookups are cached, least recently used dropped first.
+    Shard id ranges never change once assigned, so they are cached for good.
+    """
+
+    def __init__(self, ttl=5, id_range_size=100_000_000, max_entries=100000):
+        self.ttl = ttl
+        self.id_range_size = id_range_size
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._first_ids = {}
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._first_ids.clear()
+
+    def id_range(self, shard, engine):
+        """First and last row id the shard may hand out."""
+        first_id = self._first_ids.get(shard)
+        if first_id is None:
+            with engine.connect() as connection:
+                first_id = connection.execute(
+                    sa.select(_id_ranges.c.first_id).where(_id_ranges.c.shard == shard)).scalar()
+            if first_id is None:
+                if shard != DEFAULT_SHARD:
+                    raise RuntimeError(f'Shard {shard!r} has no id range, run flask --app manage init-shards')
+                first_id = 1
+            with self._lock:
+                self._first_ids[shard] = first_id
+        return first_id, first_id + self.id_range_size - 1
+
+    def lookup(self, restaurant_id, engine):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(restaurant_id)
+            if entry is not None and entry[2] > now:
+                self._entries.move_to_end(restaurant_id)
+                return entry[0], entry[1]
+        with engine.connect() as connection:
+            row = connection.execute(
+                sa.select(_assignments.c.shard, _assignments.c.status)
+                .where(_assignments.c.restaurant_id == restaurant_id)
+            ).first()
+        shard, status = row if row is not None else (DEFAULT_SHARD, 'active')
+        with self._lock:
+            self._entries[restaurant_id] = (shard, status, now + self.ttl)
+            self._entries.move_to_end(restaurant_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return shard, status
+
+
+shard_map = ShardMap()
+
+
+def _is_directory(mapper, clause):
+    if mapper is not None:
+        return mapper.local_table.name in DIRECTORY_TABLES
+    table = getattr(clause, 'table', None)
+    return getattr(table, 'name', None) in DIRECTORY_TABLES
+
+
+class RoutingSession(Session):
+    """Session that routes to the current restaurant's shard and to replicas.
+
+    Everything but the directory tables goes to the shard chosen with
+    ``use_restaurant``/``shard_scope``. On the default database, reads go to
+    one replica per session when the request opted in; flushes, DML
+    statements and anything after this session has written stay on the
+    primary so a request always sees its own writes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            shard = self.info.get(SHARD) or DEFAULT_SHARD
+            if shard != DEFAULT_SHARD and not _is_directory(mapper, clause):
+                return self._db.engines[shard_bind_key(shard)]
+        if bind is None and self._reads_from_replica(clause):
+            # One replica per session: replicas lag differently, and a request mixing
+            # them could see a newer menu version than the items it reads next
+            key = self.info.get(REPLICA)
+            if key is None:
+                keys = replica_bind_keys(self._db.engines)
+                key = self.info[REPLICA] = random.choice(keys) if keys else False
+            if key:
+                return self._db.engines[key]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _reads_from_replica(self, clause):
+        if not self.info.get(USE_REPLICA) or self.info.get(FORCE_PRIMARY):
+            return False
+        if self._flushing or self.info.get(WROTE):
+            return False
+        return not isinstance(clause, sa.sql.dml.UpdateBase)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_wrote(session, flush_context):
+    session.info[WROTE] = True
+
+
+def check_writable(session):
+    """Raise ShardMovingError if the session is routed to a restaurant being moved.
+
+    Flushes and ORM DML statements are checked automatically; bulk_*_mappings
+    and Core statements on the session's connection must call this themselves.
+    """
+    if session.info.get(FROZEN):
+        raise ShardMovingError('This restaurant is being moved, please try again shortly')
+
+
+@event.listens_for(RoutingSession, 'before_flush')
+def _reject_frozen_writes(session, flush_context, instances):
+    check_writable(session)
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _reject_frozen_statements(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        check_writable(orm_execute_state.session)
+
+
+def _db_session():
+    return current_app.extensions['sqlalchemy'].session
+
+
+@contextmanager
+def primary():
+    """Pin reads inside the block to the primary, e.g. when filling a cache."""
+    info = _db_session().info
+    previous = info.get(FORCE_PRIMARY)
+    info[FORCE_PRIMARY] = True
+    try:
+        yield
+    finally:
+        info[FORCE_PRIMARY] = previous
+
+
+def use_restaurant(restaurant_id):
+    """Route the rest of this session to ``restaurant_id``'s shard."""
+    db = current_app.extensions['sqlalchemy']
+    info = db.session.info
+    if len(shard_names(db.engines)) == 1:
+        info[SHARD], info[FROZEN] = DEFAULT_SHARD, False
+        return
+    shard, status = shard_map.lookup(int(restaurant_id), db.engines[None])
+    if shard_bind_key(shard) not in db.engines:
+        raise RuntimeError(f'Restaurant {restaurant_id} is assigned to unknown shard {shard!r}')
+    info[SHARD], info[FROZEN] = shard, status == 'moving'
+
+
+@contextmanager
+def restaurant_scope(restaurant_id):
+    """Route the session to ``restaurant_id``'s shard inside the block."""
+    info = _db_session().info
+    previous = info.get(SHARD), info.get(FROZEN)
+    use_restaurant(restaurant_id)
+    try:
+        yield
+    finally:
+        info[SHARD], info[FROZEN] = previous
+
+
+@contextmanager
+def shard_scope(shard):
+    """Route the session to a shard by name, e.g. to fan a query out."""
+    info = _db_session().info
+    previous = info.get(SHARD), info.get(FROZEN)
+    info[SHARD], info[FROZEN] = shard, False
+    try:
+        yield
+    finally:
+        info[SHARD], info[FROZEN] = previous
+
+
+def each_shard():
+    """Yield every shard name with the session routed to it."""
+    for shard in shard_names(current_app.extensions['sqlalchemy'].engines):
+        with shard_scope(shard):
+            yield shard
+
+
+def request_restaurant_id():
+    """The restaurant a request is about.
+
+    Customer endpoints name it with ``rid`` or the cart's restaurant; every
+    other endpoint acts for the logged-in restaurant and ignores ``rid``, so
+    an admin can't point their writes at another restaurant's shard.
+    """
+    if request.endpoint in PUBLIC_ENDPOINTS:
+        rid = request.args.get('rid')
+        if rid is None and request.is_json:
+            data = request.get_json(silent=True)
+            cart = data.get('cart') if isinstance(data, dict) else None
+            if isinstance(cart, dict):
+                rid = cart.get('restaurantId')
+    else:
+        rid = session.get('restaurant_id')
+    try:
+        return int(rid) if rid is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def replica_read(f):
+    """Route a GET view's reads to a replica unless this client wrote recently."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if request.method == 'GET' and time.time() >= session.get('primary_until', 0):
+            _db_session().info[USE_REPLICA] = True
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def init_app(app):
+    shard_map.ttl = app.config.get('SHARD_MAP_TTL', 5)
+    shard_map.id_range_size = app.config.get('SHARD_ID_RANGE_SIZE', 100_000_000)
+    shard_map.max_entries = app.config.get('SHARD_MAP_MAX_ENTRIES', 100000)
+    shard_map.clear()
+
+    @app.before_request
+    def route_to_restaurant_shard():
+        if request.endpoint == 'static':
+            return
+        restaurant_id = request_restaurant_id()
+        if restaurant_id is not None:
+            use_restaurant(restaurant_id)
+
+    @app.errorhandler(ShardMovingError)
+    def restaurant_moving(error):
+        response = jsonify({'success': False, 'message': str(error)})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(max(1, int(shard_map.ttl)))
+        return response
+
+    @app.after_request
+    def stick_to_primary_after_write(response):
+        # Read-your-writes: keep this client on the primary while replicas catch up
+        db_session = _db_session()
+        if db_session.registry.has() and db_session.info.get(WROTE):
+            session['primary_until'] = time.time() + app.config.get('REPLICA_STICKY_SECONDS', 5)
+        return response
+
+
+def sqlite_path(url):
+    return sa.engine.make_url(url).database
+
+
+def copy_sqlite_database(source_url, target_url):
+    """Copy one SQLite database file over another with the online backup API."""
+    source = sqlite3.connect(sqlite_path(source_url))
+    target = sqlite3.connect(sqlite_path(target_url))
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+def simulate_replication(source_url, target_urls, lag, iterations=None):
+    """Copy the primary to each replica every ``lag`` seconds, forever by default."""
+    count = 0
+    while iterations is None or count < iterations:
+        time.sleep(lag)
+        for url in target_urls:
+            copy_sqlite_database(source_url, url)
+        count += 1
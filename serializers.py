@@ -0,0 +1,126 @@
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+from models import MenuItem, Table, Order, OrderItem
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+class Schema:
+    """Declared response shape for a model, serialized from plain row tuples.
+
+    ``fields`` is a list of ``(name, column)`` or ``(name, column, convert)``
+    entries. ``columns`` can be passed straight to ``db.session.query`` or
+    ``select`` so rows come back as tuples in field order, skipping the ORM
+    identity map entirely.
+    """
+
+    def __init__(self, fields):
+        self.names = tuple(field[0] for field in fields)
+        self.columns = tuple(field[1] for field in fields)
+        self.converters = tuple((i, field[2]) for i, field in enumerate(fields) if len(field) > 2)
+        self.dump = self._compile()
+
+    def _compile(self):
+        names = self.names
+        converters = self.converters
+        if not converters:
+            def dump(row):
+                return dict(zip(names, row))
+        else:
+            def dump(row):
+                values = list(row)
+                for i, convert in converters:
+                    values[i] = convert(values[i])
+                return dict(zip(names, values))
+        return dump
+
+    def dump_object(self, obj):
+        # For schemas whose field names match the model's attribute names
+        return self.dump(tuple(getattr(obj, name) for name in self.names))
+
+    def dump_many(self, rows):
+        dump = self.dump
+        return [dump(row) for row in rows]
+
+
+ORDER = Schema([
+    ('id', Order.id),
+    ('restaurant_id', Order.restaurant_id),
+    ('table_number', Table.table_number),
+    ('status', Order.status),
+    ('total_amount', Order.total_amount),
+    ('created_at', Order.created_at, _isoformat)
+])
+
+# Compact shape pushed over Socket.IO for new orders and status changes
+ORDER_EVENT = Schema([
+    ('id', Order.id),
+    ('restaurant_id', Order.restaurant_id),
+    ('table_number', Table.table_number),
+    ('status', Order.status)
+])
+
+# order_id is used to group items under their order and dropped from the payload
+ORDER_ITEM = Schema([
+    ('order_id', OrderItem.order_id),
+    ('id', OrderItem.id),
+    ('name', MenuItem.name),
+    ('quantity', OrderItem.quantity),
+    ('price', OrderItem.price),
+    ('special_instructions', OrderItem.special_instructions)
+])
+
+MENU_ITEM = Schema([
+    ('id', MenuItem.id),
+    ('name', MenuItem.name),
+    ('description', MenuItem.description),
+    ('price', MenuItem.price),
+    ('category', MenuItem.category),
+    ('image_url', MenuItem.image_url),
+    ('is_available', MenuItem.is_available, bool)
+])
+
+
+def dumps(obj, **kwargs):
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, separators=(',', ':'))
+
+
+def loads(s, **kwargs):
+    if orjson is not None:
+        return orjson.loads(s)
+    return json.loads(s)
+
+
+class SocketJSON:
+    """JSON module for Socket.IO packets; keyword arguments are ignored."""
+    dumps = staticmethod(dumps)
+    loads = staticmethod(loads)
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that uses orjson when it is installed."""
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs.get('indent'):
+            return super().dumps(obj, **kwargs)
+        # Let Flask's default() handle dates etc. so output matches the stdlib provider
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
@@ -0,0 +1,395 @@
+import logging
+import time
+from collections import deque
+from datetime import datetime
+
+import sqlalchemy as sa
+from sqlalchemy import event, func
+
+from extensions import db
+from models import Restaurant, MenuChange, ShardAssignment, ShardIdCounter, ShardIdRange
+from routing import (DEFAULT_SHARD, DIRECTORY_TABLES, RoutingSession, restaurant_scope, shard_bind_key,
+                     shard_for_engine, shard_map, shard_names)
+
+logger = logging.getLogger(__name__)
+
+# Keeps IN (...) lists under SQLite's bound parameter limit
+ID_CHUNK = 500
+# session.info key for the ids reserved for a flush's new rows, by table name
+RESERVED_IDS = 'reserved_ids'
+
+
+class ShardMoveError(Exception):
+    """Raised when a restaurant cannot be moved to another shard."""
+
+
+def find_restaurant_id(email):
+    """Look a restaurant up by login email in the directory."""
+    restaurant_id = (db.session.query(ShardAssignment.restaurant_id)
+                     .filter(ShardAssignment.email == email).scalar())
+    if restaurant_id is None:
+        # Restaurants created before the directory existed live on the default database
+        restaurant_id = db.session.query(Restaurant.id).filter(Restaurant.email == email).scalar()
+    return restaurant_id
+
+
+def pick_shard():
+    """Place new restaurants on the shard with the fewest restaurants."""
+    counts = dict(db.session.query(ShardAssignment.shard, func.count())
+                  .group_by(ShardAssignment.shard))
+    return min(shard_names(db.engines), key=lambda shard: counts.get(shard, 0))
+
+
+def create_restaurant(**fields):
+    """Allocate an id in the directory, then create the restaurant on its shard.
+
+    The directory row is committed first so there is never a restaurant
+    nobody can log in to; if the shard insert fails it is deleted again so
+    the email can be registered later. Returns the new restaurant's id.
+    """
+    assignment = ShardAssignment(email=fields['email'], shard=pick_shard(), status='active')
+    db.session.add(assignment)
+    db.session.commit()
+    restaurant_id = assignment.restaurant_id
+
+    try:
+        with restaurant_scope(restaurant_id):
+            db.session.add(Restaurant(id=restaurant_id, **fields))
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        db.session.query(ShardAssignment).filter_by(restaurant_id=restaurant_id).delete()
+        db.session.commit()
+        raise
+    return restaurant_id
+
+
+def shard_tables():
+    """Tables holding restaurant rows on every shard, parents before children."""
+    return [table for table in db.metadata.sorted_tables
+            if table.name not in DIRECTORY_TABLES and table.name != ShardIdCounter.__tablename__]
+
+
+def register_id_ranges():
+    """Give every configured shard its own id range; existing ranges are kept."""
+    ranges = dict(db.session.query(ShardIdRange.shard, ShardIdRange.first_id))
+    ranges.setdefault(DEFAULT_SHARD, 1)
+    for shard in shard_names(db.engines):
+        if shard not in ranges:
+            ranges[shard] = max(ranges.values()) + shard_map.id_range_size
+    existing = {shard for shard, in db.session.query(ShardIdRange.shard)}
+    db.session.add_all(ShardIdRange(shard=shard, first_id=first_id)
+                       for shard, first_id in ranges.items() if shard not in existing)
+    db.session.commit()
+    return ranges
+
+
+def next_ids(connection, table, count=1):
+    """Reserve ``count`` ids for new rows inside the range of the shard ``connection`` points at.
+
+    Returns None when the database should pick: without shards, or on
+    PostgreSQL, whose sequences are kept inside the range instead. Other
+    databases take ids from the shard's counter row for the table. Bumping
+    it holds the write lock until the transaction ends, so concurrent
+    writers never get the same ids, and a rollback hands them back.
+    """
+    if len(shard_names(db.engines)) == 1 or connection.dialect.name == 'postgresql':
+        return None
+    shard = shard_for_engine(db.engines, connection.engine)
+    counters = ShardIdCounter.__table__
+    row = counters.c.table_name == table.name
+    if not connection.execute(counters.update().where(row).values(next_id=counters.c.next_id + count)).rowcount:
+        raise RuntimeError(f'Shard {shard!r} has no id counter for {table.name}, '
+                           f'run flask --app manage init-shards')
+    end = connection.execute(sa.select(counters.c.next_id).where(row)).scalar()
+    first_id, last_id = shard_map.id_range(shard, db.engines[None])
+    if end - 1 > last_id:
+        raise RuntimeError(f'Shard {shard!r} has run out of ids for {table.name}')
+    return list(range(end - count, end))
+
+
+def _needs_shard_id(mapper, target):
+    # Restaurant ids come from the directory
+    return (mapper.local_table.name not in DIRECTORY_TABLES
+            and mapper.local_table.name not in (Restaurant.__tablename__, ShardIdCounter.__tablename__)
+            and getattr(target, 'id', None) is None)
+
+
+@event.listens_for(RoutingSession, 'before_flush')
+def _reserve_shard_ids(session, flush_context, instances):
+    # One counter bump per table and flush, instead of one per row
+    session.info[RESERVED_IDS] = reserved = {}
+    if len(shard_names(db.engines)) == 1:
+        return
+    counts = {}
+    for target in session.new:
+        mapper = sa.inspect(target).mapper
+        if _needs_shard_id(mapper, target):
+            counts[mapper] = counts.get(mapper, 0) + 1
+    for mapper, count in counts.items():
+        ids = next_ids(session.connection(bind_arguments={'mapper': mapper}), mapper.local_table, count)
+        if ids:
+            reserved[mapper.local_table.name] = deque(ids)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _release_shard_ids(session, flush_context):
+    session.info.pop(RESERVED_IDS, None)
+
+
+@event.listens_for(db.Model, 'before_insert', propagate=True)
+def _assign_shard_id(mapper, connection, target):
+    if not _needs_shard_id(mapper, target):
+        return
+    session = sa.orm.object_session(target)
+    reserved = session.info.get(RESERVED_IDS, {}).get(mapper.local_table.name) if session else None
+    if reserved:
+        target.id = reserved.popleft()
+        return
+    # Rows added during the flush itself weren't counted up front
+    ids = next_ids(connection, mapper.local_table)
+    if ids:
+        target.id = ids[0]
+
+
+def seed_id_counters(connection, shard):
+    """Start each table's id counter past the shard's rows, inside its range.
+
+    Existing counters only ever move forward. PostgreSQL uses its sequences
+    instead, see advance_sequences().
+    """
+    if connection.dialect.name == 'postgresql':
+        return
+    first_id, last_id = shard_map.id_range(shard, db.engines[None])
+    counters = ShardIdCounter.__table__
+    current = dict(connection.execute(sa.select(counters.c.table_name, counters.c.next_id)).all())
+    for table in shard_tables():
+        if table.name == Restaurant.__tablename__:
+            continue  # Restaurant ids come from the directory
+        highest = connection.execute(sa.select(func.max(table.c.id))
+                                     .where(table.c.id.between(first_id, last_id))).scalar() or 0
+        wanted = max(highest + 1, first_id, current.get(table.name, 0))
+        if table.name in current:
+            connection.execute(counters.update().where(counters.c.table_name == table.name)
+                               .values(next_id=wanted))
+        else:
+            connection.execute(counters.insert().values(table_name=table.name, next_id=wanted))
+
+
+def advance_sequences(connection, shard):
+    """On PostgreSQL, move each table's id sequence past the shard's rows, inside its range."""
+    if connection.dialect.name != 'postgresql':
+        return
+    first_id, last_id = shard_map.id_range(shard, db.engines[None])
+    quote = connection.dialect.identifier_preparer.quote
+    for table in shard_tables():
+        if table.name == Restaurant.__tablename__:
+            continue  # Restaurant ids come from the directory
+        sequence = connection.execute(sa.select(func.pg_get_serial_sequence(quote(table.name), 'id'))).scalar()
+        if sequence is None:
+            continue
+        current = connection.execute(sa.text(f'SELECT last_value FROM {sequence}')).scalar()
+        highest = connection.execute(sa.select(func.max(table.c.id))
+                                     .where(table.c.id.between(first_id, last_id))).scalar() or 0
+        wanted = max(highest + 1, first_id, current + 1 if first_id <= current <= last_id else 0)
+        connection.execute(sa.select(func.setval(sequence, wanted, False)))
+
+
+def create_shard_schemas():
+    """Create the tables on every configured shard database and start their ids in its range."""
+    tables = shard_tables() + [ShardIdCounter.__table__]
+    for shard in shard_names(db.engines):
+        engine = db.engines[shard_bind_key(shard)]
+        if shard != DEFAULT_SHARD:
+            db.metadata.create_all(engine, tables=tables)
+        with engine.begin() as connection:
+            advance_sequences(connection, shard)
+            seed_id_counters(connection, shard)
+
+
+def backfill_directory():
+    """Add directory rows for default-database restaurants that have none."""
+    assigned = sa.select(ShardAssignment.restaurant_id)
+    rows = (db.session.query(Restaurant.id, Restaurant.email)
+            .filter(Restaurant.id.not_in(assigned)).all())
+    db.session.add_all(ShardAssignment(restaurant_id=restaurant_id, email=email,
+                                       shard=DEFAULT_SHARD, status='active')
+                       for restaurant_id, email in rows)
+    db.session.commit()
+    return len(rows)
+
+
+def restaurant_rows(table, restaurant_id):
+    """WHERE clause selecting ``restaurant_id``'s rows in a shard table."""
+    if table.name == Restaurant.__tablename__:
+        return table.c.id == restaurant_id
+    if 'restaurant_id' in table.c:
+        return table.c.restaurant_id == restaurant_id
+    if 'order_id' in table.c:
+        orders = db.metadata.tables['order']
+        return table.c.order_id.in_(sa.select(orders.c.id).where(orders.c.restaurant_id == restaurant_id))
+    raise ShardMoveError(f'Cannot tell which restaurant owns rows in {table.name}')
+
+
+def _chunks(ids):
+    ids = sorted(ids)
+    for start in range(0, len(ids), ID_CHUNK):
+        yield ids[start:start + ID_CHUNK]
+
+
+def copied_tables():
+    """Shard tables whose rows a move copies as they are.
+
+    The menu change log is left behind: its ids are menu versions, so the
+    target gets a single reset change instead and clients refetch the menu.
+    """
+    return [table for table in shard_tables() if table.name != MenuChange.__tablename__]
+
+
+def find_collisions(restaurant_id, source, target):
+    """Ids of this restaurant's rows that another restaurant already uses on ``target``.
+
+    Shards number rows from separate id ranges, so this only finds rows
+    created before sharding was set up.
+    """
+    collisions = {}
+    for table in copied_tables():
+        where = restaurant_rows(table, restaurant_id)
+        ids = source.execute(sa.select(table.c.id).where(where)).scalars().all()
+        taken = []
+        for chunk in _chunks(ids):
+            taken.extend(target.execute(
+                sa.select(table.c.id).where(table.c.id.in_(chunk), sa.not_(where))
+            ).scalars())
+        if taken:
+            collisions[table.name] = sorted(taken)
+    return collisions
+
+
+def sync_restaurant(restaurant_id, source, target):
+    """Make ``target``'s copy of a restaurant's rows match ``source``.
+
+    Inserts and updates run parents first and deletes children first, so
+    foreign keys hold throughout. Returns per-table counts of rows written.
+    """
+    counts = {}
+    deletes = []
+    for table in copied_tables():
+        where = restaurant_rows(table, restaurant_id)
+        wanted = {row.id: row for row in source.execute(sa.select(table).where(where))}
+        existing = {row.id: row for row in target.execute(sa.select(table).where(where))}
+
+        inserts = [dict(row._mapping) for row_id, row in wanted.items() if row_id not in existing]
+        updates = [dict(row._mapping) for row_id, row in wanted.items()
+                   if row_id in existing and existing[row_id] != row]
+        if inserts:
+            target.execute(table.insert(), inserts)
+        for values in updates:
+            target.execute(table.update().where(table.c.id == values['id']).values(values))
+        deletes.append((table, set(existing) - set(wanted)))
+        counts[table.name] = len(inserts) + len(updates)
+
+    for table, ids in reversed(deletes):
+        for chunk in _chunks(ids):
+            target.execute(table.delete().where(table.c.id.in_(chunk)))
+        counts[table.name] += len(ids)
+    return counts
+
+
+def purge_restaurant(restaurant_id, connection):
+    """Delete a restaurant's rows from a shard, children first."""
+    counts = {}
+    for table in reversed(shard_tables()):
+        counts[table.name] = connection.execute(
+            table.delete().where(restaurant_rows(table, restaurant_id))).rowcount
+    return counts
+
+
+def _reset_menu(restaurant_id, connection):
+    changes = MenuChange.__table__
+    values = {'restaurant_id': restaurant_id, 'op': 'reset', 'created_at': datetime.utcnow()}
+    ids = next_ids(connection, changes)
+    if ids:
+        values['id'] = ids[0]
+    connection.execute(changes.insert().values(values))
+
+
+def _set_assignment(restaurant_id, email, shard, status):
+    assignment = db.session.get(ShardAssignment, restaurant_id)
+    if assignment is None:
+        assignment = ShardAssignment(restaurant_id=restaurant_id, email=email)
+        db.session.add(assignment)
+    assignment.shard = shard
+    assignment.status = status
+    db.session.commit()
+
+
+def move_restaurant(restaurant_id, target_shard, settle=None):
+    """Move a restaurant's rows to another shard while it keeps serving.
+
+    1. Copy everything while the restaurant stays writable.
+    2. Mark it ``moving`` so writes get a 503, and wait for every process's
+       shard map to notice.
+    3. Copy what changed during step 1, then point the directory at the
+       target shard.
+    4. Wait for stale readers to move over and delete the source rows.
+
+    Rows keep their ids; every shard numbers rows from its own id range, so
+    they can't clash with the target's rows.
+    """
+    settle = shard_map.ttl + 1 if settle is None else settle
+    if target_shard not in shard_names(db.engines):
+        raise ShardMoveError(f'Unknown shard {target_shard!r}')
+
+    assignment = db.session.get(ShardAssignment, restaurant_id)
+    source_shard = assignment.shard if assignment is not None else DEFAULT_SHARD
+    if assignment is not None and assignment.status == 'moving':
+        raise ShardMoveError(f'Restaurant {restaurant_id} is already being moved')
+    if source_shard == target_shard:
+        raise ShardMoveError(f'Restaurant {restaurant_id} is already on shard {target_shard!r}')
+
+    source = db.engines[shard_bind_key(source_shard)]
+    target = db.engines[shard_bind_key(target_shard)]
+    restaurants = Restaurant.__table__
+    with source.connect() as connection:
+        email = connection.execute(sa.select(restaurants.c.email)
+                                   .where(restaurants.c.id == restaurant_id)).scalar()
+        if email is None:
+            raise ShardMoveError(f'Restaurant {restaurant_id} not found on shard {source_shard!r}')
+        with target.connect() as target_connection:
+            collisions = find_collisions(restaurant_id, connection, target_connection)
+    if collisions:
+        details = '; '.join(f'{name}: {ids[:10]}' for name, ids in collisions.items())
+        raise ShardMoveError(f'Ids already used on shard {target_shard!r}: {details}')
+
+    logger.info('Copying restaurant %s from %s to %s', restaurant_id, source_shard, target_shard)
+    with source.connect() as connection, target.begin() as target_connection:
+        copied = sync_restaurant(restaurant_id, connection, target_connection)
+
+    _set_assignment(restaurant_id, email, source_shard, 'moving')
+    try:
+        time.sleep(settle)
+        logger.info('Copying changes for restaurant %s with writes frozen', restaurant_id)
+        with source.connect() as connection, target.begin() as target_connection:
+            delta = sync_restaurant(restaurant_id, connection, target_connection)
+            _reset_menu(restaurant_id, target_connection)
+            advance_sequences(target_connection, target_shard)
+        _set_assignment(restaurant_id, email, target_shard, 'active')
+    except Exception:
+        db.session.rollback()
+        _set_assignment(restaurant_id, email, source_shard, 'active')
+        raise
+    shard_map.clear()
+
+    time.sleep(settle)
+    with source.begin() as connection:
+        purged = purge_restaurant(restaurant_id, connection)
+    logger.info('Moved restaurant %s to %s', restaurant_id, target_shard)
+
+    return {
+        'source': source_shard,
+        'target': target_shard,
+        'copied': copied,
+        'delta': delta,
+        'purged': purged
+    }
@@ -0,0 +1,115 @@
+// Service worker for the customer menu.
+// Answers menu page loads with a cached item-less shell of the page, which
+// renders the items from the cached menu snapshot, so a scan opens the
+// menu instantly (even offline) and only fetches the changes since the
+// cached snapshot version over the network.
+
+const CACHE_VERSION = 'menu-v2';
+const PAGE_CACHE = `${CACHE_VERSION}-pages`;
+const SNAPSHOT_CACHE = `${CACHE_VERSION}-snapshots`;
+
+self.addEventListener('install', () => self.skipWaiting());
+
+self.addEventListener('activate', event => {
+    // Drop caches left behind by older versions of this worker
+    event.waitUntil(
+        caches.keys()
+            .then(keys => Promise.all(
+                keys.filter(key => !key.startsWith(CACHE_VERSION)).map(key => caches.delete(key))
+            ))
+            .then(() => self.clients.claim())
+    );
+});
+
+self.addEventListener('fetch', event => {
+    const url = new URL(event.request.url);
+    if (event.request.method !== 'GET' || url.origin !== self.location.origin) {
+        return;
+    }
+    if (url.pathname === '/api/menu' && url.searchParams.has('cached')) {
+        event.respondWith(cachedSnapshot(url));
+    } else if (url.pathname === '/api/menu' && !url.searchParams.has('since')) {
+        event.respondWith(syncSnapshot(url));
+    } else if (url.pathname === '/menu' && event.request.mode === 'navigate' && url.searchParams.has('rid')) {
+        event.respondWith(menuShell(event, url));
+    }
+});
+
+async function menuShell(event, url) {
+    // Stale-while-revalidate: answer from the cached shell right away and refresh
+    // it in the background, so template and restaurant changes show up next time.
+    // The shell has no items and reads the table from the page URL, so one copy
+    // per restaurant serves every table.
+    const key = `/menu?rid=${url.searchParams.get('rid')}&shell=1`;
+    const cache = await caches.open(PAGE_CACHE);
+    const cached = await cache.match(key);
+    const refreshed = fetch(key).then(response => {
+        if (response.ok) {
+            return cache.put(key, response.clone()).then(() => response);
+        }
+        return response;
+    });
+    if (cached) {
+        event.waitUntil(refreshed.catch(() => {}));
+        return cached;
+    }
+    return refreshed;
+}
+
+function jsonResponse(data) {
+    return new Response(JSON.stringify(data), {
+        headers: {'Content-Type': 'application/json'}
+    });
+}
+
+function applyDelta(snapshot, delta) {
+    const items = new Map(snapshot.items.map(item => [item.id, item]));
+    delta.items.forEach(item => items.set(item.id, item));
+    delta.deleted.forEach(id => items.delete(id));
+    return {
+        restaurant_id: snapshot.restaurant_id,
+        version: delta.version,
+        full: true,
+        items: Array.from(items.values()).sort((a, b) => a.id - b.id),
+        deleted: []
+    };
+}
+
+async function cachedSnapshot(url) {
+    // The last known menu, without waiting for the network; the page syncs it next
+    const key = `/api/menu?rid=${url.searchParams.get('rid')}`;
+    const cache = await caches.open(SNAPSHOT_CACHE);
+    const cached = await cache.match(key);
+    return cached || syncSnapshot(url);
+}
+
+async function syncSnapshot(url) {
+    const key = `/api/menu?rid=${url.searchParams.get('rid')}`;
+    const cache = await caches.open(SNAPSHOT_CACHE);
+    const cached = await cache.match(key);
+
+    if (!cached) {
+        const response = await fetch(key);
+        if (response.ok) {
+            cache.put(key, response.clone());
+        }
+        return response;
+    }
+
+    const snapshot = await cached.json();
+    try {
+        const response = await fetch(`${key}&since=${snapshot.version}`, {
+            headers: {'If-None-Match': `"menu-${snapshot.restaurant_id}-${snapshot.version}-${snapshot.version}"`}
+        });
+        if (response.status === 304 || !response.ok) {
+            return jsonResponse(snapshot);
+        }
+        const delta = await response.json();
+        const updated = delta.full ? delta : applyDelta(snapshot, delta);
+        await cache.put(key, jsonResponse(updated));
+        return jsonResponse(updated);
+    } catch (error) {
+        // Offline: serve the last known menu
+        return jsonResponse(snapshot);
+    }
+}
@@ -0,0 +1,247 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+dead_letter_logger = logging.getLogger(__name__ + '.dead_letter')
+
+PENDING_KEY = 'pending_tasks'
+
+
+class Task:
+    def __init__(self, name, args=(), kwargs=None):
+        self.name = name
+        self.args = tuple(args)
+        self.kwargs = dict(kwargs or {})
+        self.attempts = 0
+        self.enqueued_at = time.monotonic()
+
+    def __repr__(self):
+        return f'<Task {self.name} attempts={self.attempts}>'
+
+
+class LocalBackend:
+    """In-process FIFO backend. Tasks are lost if the process dies.
+
+    With a Socket.IO server the queue comes from its async mode, so workers
+    running as eventlet green threads block cooperatively.
+    """
+
+    def __init__(self, app=None, socketio=None):
+        if socketio is not None:
+            self._queue = socketio.server.eio.create_queue()
+            self._empty = socketio.server.eio.get_queue_empty_exception()
+        else:
+            self._queue = queue.Queue()
+            self._empty = queue.Empty
+
+    def put(self, task):
+        self._queue.put(task)
+
+    def get(self, timeout=None):
+        try:
+            return self._queue.get(timeout=timeout)
+        except self._empty:
+            return None
+
+    def task_done(self):
+        self._queue.task_done()
+
+    def qsize(self):
+        return self._queue.qsize()
+
+
+# Backends are looked up by TASK_QUEUE_BACKEND; register a durable one here
+BACKENDS = {
+    'local': LocalBackend
+}
+
+
+class TaskQueue:
+    """Worker pool for work that should run after a transaction commits.
+
+    Tasks are registered by name with the ``task`` decorator so a backend
+    only ever has to store a name and JSON-friendly arguments.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.socketio = None
+        self.backend = None
+        self.tasks = {}
+        self.workers = []
+        self._done = []
+        self.dead_letters = deque(maxlen=100)
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._reset_metrics()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app, socketio=None):
+        """Set up workers for ``app``.
+
+        Pass the app's ``SocketIO`` so workers are started and sleep through
+        its async mode (eventlet green threads instead of OS threads); tasks
+        that emit Socket.IO events must run that way.
+        """
+        self.shutdown()
+        self.app = app
+        self.socketio = socketio
+        self.max_retries = app.config.get('TASK_QUEUE_MAX_RETRIES', 3)
+        self.retry_delay = app.config.get('TASK_QUEUE_RETRY_DELAY', 0.5)
+        backend_cls = BACKENDS[app.config.get('TASK_QUEUE_BACKEND', 'local')]
+        self.backend = backend_cls(app, socketio)
+        self.dead_letters.clear()
+        self._reset_metrics()
+        self._stopping.clear()
+
+        # With no workers, tasks run inline right after commit (used in tests)
+        for i in range(app.config.get('TASK_QUEUE_WORKERS', 2)):
+            done = threading.Event()
+            if socketio is not None:
+                worker = socketio.start_background_task(self._work, done)
+            else:
+                worker = threading.Thread(target=self._work, args=(done,), name=f'task-worker-{i}', daemon=True)
+                worker.start()
+            self.workers.append(worker)
+            self._done.append(done)
+
+    def _sleep(self, seconds):
+        if self.socketio is not None:
+            self.socketio.sleep(seconds)
+        else:
+            time.sleep(seconds)
+
+    def _reset_metrics(self):
+        self.counters = {'enqueued': 0, 'completed': 0, 'retried': 0, 'dead_lettered': 0}
+        self.wait_times = deque(maxlen=1000)
+        self.run_times = deque(maxlen=1000)
+
+    def task(self, fn):
+        self.tasks[fn.__name__] = fn
+        return fn
+
+    def enqueue(self, fn, *args, **kwargs):
+        name = fn if isinstance(fn, str) else fn.__name__
+        if name not in self.tasks:
+            raise KeyError(f'Unknown task: {name}')
+        task = Task(name, args, kwargs)
+        with self._lock:
+            self.counters['enqueued'] += 1
+        if self.workers:
+            self.backend.put(task)
+        else:
+            self._run(task)
+
+    def enqueue_after_commit(self, session, fn, *args, **kwargs):
+        """Queue a task that only runs if ``session``'s transaction commits."""
+        session.info.setdefault(PENDING_KEY, []).append((fn, args, kwargs))
+
+    def _work(self, done):
+        try:
+            while not self._stopping.is_set():
+                task = self.backend.get(timeout=0.5)
+                if task is None:
+                    continue
+                try:
+                    self._run(task)
+                finally:
+                    self.backend.task_done()
+        finally:
+            done.set()
+
+    def _run(self, task):
+        started = time.monotonic()
+        fn = self.tasks[task.name]
+        while True:
+            task.attempts += 1
+            try:
+                with self.app.app_context():
+                    fn(*task.args, **task.kwargs)
+            except Exception as e:
+                if task.attempts > self.max_retries:
+                    self._dead_letter(task, e)
+                    break
+                with self._lock:
+                    self.counters['retried'] += 1
+                logger.warning('Task %s failed (attempt %d), retrying: %s', task.name, task.attempts, e)
+                self._sleep(self.retry_delay * 2 ** (task.attempts - 1))
+            else:
+                with self._lock:
+                    self.counters['completed'] += 1
+                break
+        finished = time.monotonic()
+        with self._lock:
+            self.wait_times.append(started - task.enqueued_at)
+            self.run_times.append(finished - started)
+
+    def _dead_letter(self, task, error):
+        with self._lock:
+            self.counters['dead_lettered'] += 1
+        self.dead_letters.append({
+            'task': task.name,
+            'args': task.args,
+            'kwargs': task.kwargs,
+            'attempts': task.attempts,
+            'error': repr(error)
+        })
+        dead_letter_logger.error('Task %s gave up after %d attempts: %r (args=%r kwargs=%r)',
+                                 task.name, task.attempts, error, task.args, task.kwargs)
+
+    def metrics(self):
+        def summary(samples):
+            if not samples:
+                return {'count': 0, 'avg_ms': 0.0, 'p95_ms': 0.0, 'max_ms': 0.0}
+            ordered = sorted(samples)
+            return {
+                'count': len(ordered),
+                'avg_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+                'p95_ms': round(ordered[int(0.95 * (len(ordered) - 1))] * 1000, 3),
+                'max_ms': round(ordered[-1] * 1000, 3)
+            }
+
+        with self._lock:
+            return {
+                'depth': self.backend.qsize() if self.backend else 0,
+                'workers': len(self.workers),
+                **self.counters,
+                'wait': summary(self.wait_times),
+                'run': summary(self.run_times)
+            }
+
+    def shutdown(self, timeout=10):
+        """Let workers drain the queue, then stop them."""
+        if not self.workers:
+            return
+        deadline = time.monotonic() + timeout
+        while self.backend.qsize() and time.monotonic() < deadline:
+            self._sleep(0.05)
+        self._stopping.set()
+        # Poll rather than join: eventlet workers' join() takes no timeout
+        while not all(done.is_set() for done in self._done) and time.monotonic() < deadline:
+            self._sleep(0.05)
+        self.workers = []
+        self._done = []
+
+
+task_queue = TaskQueue()
+atexit.register(task_queue.shutdown)
+
+
+@event.listens_for(Session, 'after_commit')
+def _submit_pending_tasks(session):
+    for fn, args, kwargs in session.info.pop(PENDING_KEY, []):
+        task_queue.enqueue(fn, *args, **kwargs)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_pending_tasks(session, previous_transaction):
+    if not session.in_transaction():
+        session.info.pop(PENDING_KEY, None)
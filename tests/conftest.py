@@ -0,0 +1,49 @@
+import pytest
+from app import create_app
+from extensions import db
+from models import Restaurant, Table
+
+
+@pytest.fixture
+def env(monkeypatch):
+    """Environment read by create_app(); modules override this to add settings."""
+    monkeypatch.setenv('DATABASE_URL', 'sqlite:///:memory:')
+    monkeypatch.setenv('TASK_QUEUE_WORKERS', '0')
+    return monkeypatch
+
+
+@pytest.fixture
+def seed_rows():
+    """Rows added after the "Cafe" restaurant (id 1); modules override this for their own data."""
+    return [Table(table_number='1', restaurant_id=1)]
+
+
+@pytest.fixture
+def app(env, seed_rows):
+    app = create_app()
+    app.config.update({"TESTING": True})
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(Restaurant(name='Cafe', email='cafe@example.com', password='x'))
+        db.session.flush()
+        db.session.add_all(seed_rows)
+        db.session.commit()
+
+    yield app
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['restaurant_id'] = 1
+    return client
+
+
+@pytest.fixture(autouse=True)
+def forget_bind_metadata():
+    yield
+    # Bind metadata is registered on the shared db object; don't leak it to other apps
+    for key in [key for key in db.metadatas if key is not None]:
+        del db.metadatas[key]
@@ -0,0 +1,107 @@
+import threading
+
+import pytest
+from app import create_app
+from extensions import db
+from models import Restaurant, Table
+from admission import MemoryStore, admission, parse_rate
+
+
+def test_token_bucket_refills_over_time():
+    store = MemoryStore()
+    rate, burst = parse_rate('2/1:3')
+
+    assert [store.consume('ip:1', rate, burst, now=0) for _ in range(3)] == [0, 0, 0]
+    assert store.consume('ip:1', rate, burst, now=0) == pytest.approx(0.5)
+    assert store.consume('ip:1', rate, burst, now=1) == 0
+
+
+def test_memory_store_is_capped():
+    store = MemoryStore(max_buckets=3)
+    for i in range(10):
+        store.consume(f'restaurant:{i}', 1, 1, now=0)
+    assert list(store._buckets) == ['restaurant:7', 'restaurant:8', 'restaurant:9']
+
+
+@pytest.fixture
+def env(env):
+    env.setenv('RATELIMIT_PER_IP', '1/60:3')
+    env.setenv('RATELIMIT_PER_RESTAURANT', '1/60:5')
+    return env
+
+
+@pytest.fixture
+def seed_rows(seed_rows):
+    return seed_rows + [Restaurant(name='Diner', email='diner@example.com', password='x'),
+                        Table(table_number='1', restaurant_id=2)]
+
+
+def test_public_endpoints_are_limited_per_ip(app):
+    client = app.test_client()
+    statuses = [client.get('/menu?rid=1&tid=1').status_code for _ in range(4)]
+
+    assert statuses == [200, 200, 200, 429]
+    assert admission.metrics()['throttled_ip'] == 1
+    # Other clients are unaffected
+    other = app.test_client()
+    assert other.get('/menu?rid=1&tid=1', environ_base={'REMOTE_ADDR': '10.0.0.2'}).status_code == 200
+
+
+def test_public_endpoints_are_limited_per_restaurant(app):
+    for i in range(6):
+        response = app.test_client().get('/menu?rid=1&tid=1', environ_base={'REMOTE_ADDR': f'10.0.1.{i}'})
+    assert response.status_code == 429
+    assert admission.metrics()['throttled_restaurant'] == 1
+    assert app.test_client().get('/menu?rid=2&tid=2').status_code == 200
+
+
+def test_restaurant_ids_are_normalized(app):
+    for i, rid in enumerate(['1', '01', '001', '%201', '1', '01']):
+        response = app.test_client().get(f'/menu?rid={rid}&tid=1', environ_base={'REMOTE_ADDR': f'10.0.2.{i}'})
+    assert response.status_code == 429
+
+    response = app.test_client().get('/menu?rid=abc&tid=1', environ_base={'REMOTE_ADDR': '10.0.3.1'})
+    assert response.status_code == 400
+
+
+def test_browsing_is_shed_before_critical_routes(app):
+    admission.browse_concurrency = 1
+    admission.max_concurrency = 2
+    entered, release = threading.Event(), threading.Event()
+
+    @app.route('/slow')
+    def slow():
+        entered.set()
+        release.wait(5)
+        return 'ok'
+
+    worker = threading.Thread(target=app.test_client().get, args=('/slow',))
+    worker.start()
+    entered.wait(5)
+    try:
+        assert app.test_client().get('/menu?rid=1&tid=1').status_code == 503
+        assert app.test_client().get('/admin/login').status_code == 200
+    finally:
+        release.set()
+        worker.join()
+
+    assert admission.metrics()['shed_browse'] == 1
+    assert admission.metrics()['in_flight'] == 0
+
+
+def test_clients_behind_a_trusted_proxy_are_limited_separately(env):
+    env.setenv('RATELIMIT_TRUSTED_PROXIES', '1')
+    app = create_app()
+    app.config.update({"TESTING": True})
+    with app.app_context():
+        db.create_all()
+        db.session.add(Restaurant(name='Cafe', email='cafe@example.com', password='x'))
+        db.session.commit()
+
+    def get(client_ip):
+        return app.test_client().get('/api/wait_time?rid=1', environ_base={'REMOTE_ADDR': '10.0.0.1'},
+                                     headers={'X-Forwarded-For': client_ip}).status_code
+
+    assert [get('203.0.113.7') for _ in range(4)] == [200, 200, 200, 429]
+    # Same balancer address, different customer
+    assert get('203.0.113.8') == 200
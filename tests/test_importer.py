@@ -0,0 +1,78 @@
+import io
+
+import pytest
+from models import MenuItem, Table
+from importer import import_data, ImportValidationError
+
+
+@pytest.fixture
+def seed_rows():
+    return [Table(table_number='2', capacity=4, location='Patio', restaurant_id=1),
+            MenuItem(name='Tea', price=20, category='Drinks', restaurant_id=1)]
+
+
+def test_table_range_import_skips_existing(app):
+    with app.app_context():
+        plan = import_data(1, 'tables', '[{"table_number": "1-5", "capacity": 4, "location": "Patio"}]', 'json')
+
+        assert [t['table_number'] for t in plan['create']] == ['1', '3', '4', '5']
+        assert [t['table_number'] for t in plan['unchanged']] == ['2']
+        assert Table.query.filter_by(restaurant_id=1).count() == 5
+
+
+def test_menu_import_dry_run_writes_nothing(app):
+    csv_text = 'name,price,category\nTea,25,Drinks\nCoffee,40,Drinks\n'
+    with app.app_context():
+        plan = import_data(1, 'menu', csv_text, 'csv', dry_run=True)
+
+        assert [i['name'] for i in plan['create']] == ['Coffee']
+        assert [i['name'] for i in plan['update']] == ['Tea']
+        assert MenuItem.query.count() == 1
+
+
+def test_invalid_rows_reject_whole_file(app):
+    csv_text = 'name,price\nCoffee,40\nCake,free\n'
+    with app.app_context():
+        with pytest.raises(ImportValidationError) as exc:
+            import_data(1, 'menu', csv_text, 'csv')
+
+        assert exc.value.errors == ["Row 2: invalid price 'free'"]
+        assert MenuItem.query.count() == 1
+
+
+def test_import_endpoint(client):
+    data = {
+        'kind': 'menu',
+        'file': (io.BytesIO(b'name,price,category\nCoffee,40,Drinks\n'), 'menu.csv')
+    }
+    response = client.post('/admin/import', data=data, content_type='multipart/form-data')
+
+    assert response.status_code == 200
+    assert len(response.json['plan']['create']) == 1
+    results = client.get('/api/menu/search?rid=1&q=coffee').json['results']
+    assert [i['name'] for i in results] == ['Coffee']
+
+
+def test_malformed_uploads_are_rejected(client):
+    for kind, body, filename, error in [
+        ('menu', b'[1, 2]', 'menu.json', 'Row 1: expected an object'),
+        ('tables', b'["1-10"]', 'tables.json', 'Row 1: expected an object'),
+        ('menu', 'name,price\nCafé,40\n'.encode('latin-1'), 'menu.csv', 'File must be UTF-8 encoded'),
+        ('tables', b'{"rows": []}', 'tables.json', 'JSON object must have a "tables" list'),
+    ]:
+        data = {'kind': kind, 'file': (io.BytesIO(body), filename)}
+        response = client.post('/admin/import', data=data, content_type='multipart/form-data')
+
+        assert response.status_code == 400
+        assert response.json['errors'][0] == error
+
+
+def test_json_wrapper_must_match_kind(app):
+    text = '{"tables": [{"table_number": "9"}], "menu_items": [{"name": "Coffee", "price": 40}]}'
+    with app.app_context():
+        plan = import_data(1, 'menu', text, 'json', dry_run=True)
+        assert [i['name'] for i in plan['create']] == ['Coffee']
+
+        with pytest.raises(ImportValidationError) as exc:
+            import_data(1, 'menu', '{"tables": [{"table_number": "9"}]}', 'json')
+        assert exc.value.errors == ['JSON object must have a "menu_items" list']
@@ -0,0 +1,70 @@
+import pytest
+from models import MenuItem
+from menu_index import RestaurantMenu
+
+
+@pytest.fixture
+def seed_rows(seed_rows):
+    return seed_rows + [
+        MenuItem(name='Margherita Pizza', description='Tomato and basil', price=250,
+                 category='Pizza', restaurant_id=1),
+        MenuItem(name='Paneer Tikka', description='Smoky cottage cheese', price=220,
+                 category='Starters', restaurant_id=1),
+        MenuItem(name='Pepperoni Pizza', description='Spicy', price=300,
+                 category='Pizza', is_available=False, restaurant_id=1),
+    ]
+
+
+def test_prefix_and_fuzzy_search():
+    menu = RestaurantMenu()
+    menu.upsert({'id': 1, 'name': 'Margherita Pizza', 'description': 'Tomato', 'price': 1,
+                 'category': 'Pizza', 'image_url': None, 'is_available': True})
+    menu.upsert({'id': 2, 'name': 'Masala Dosa', 'description': 'Potato', 'price': 1,
+                 'category': 'South Indian', 'image_url': None, 'is_available': True})
+
+    assert [i['id'] for i in menu.search('mar')] == [1]
+    assert [i['id'] for i in menu.search('dosaa')] == [2]
+    assert [i['id'] for i in menu.search('', categories=['South Indian'])] == [2]
+
+    menu.remove(2)
+    assert menu.search('dosa') == []
+
+
+def test_categories_are_cached_per_version():
+    menu = RestaurantMenu()
+    menu.upsert({'id': 1, 'name': 'Tea', 'description': None, 'price': 1,
+                 'category': 'Drinks', 'image_url': None, 'is_available': True})
+    first = menu.categories()
+    assert menu.categories() is first
+
+    menu.upsert({'id': 2, 'name': 'Coffee', 'description': None, 'price': 1,
+                 'category': 'Drinks', 'image_url': None, 'is_available': True})
+    assert [i['id'] for i in dict(menu.categories())['Drinks']] == [1, 2]
+
+
+def test_search_endpoint_filters_unavailable_items(client):
+    response = client.get('/api/menu/search?rid=1&q=pizza')
+    assert response.status_code == 200
+    assert [i['name'] for i in response.json['results']] == ['Margherita Pizza']
+
+
+def test_admin_edit_updates_index(client):
+    client.get('/api/menu/search?rid=1&q=pizza')
+
+    client.post('/admin/update_item_availability', json={'item_id': 3, 'is_available': True})
+
+    response = client.get('/api/menu/search?rid=1&q=pizza')
+    assert len(response.json['results']) == 2
+
+
+def test_menu_page_renders_grouped_categories(client):
+    response = client.get('/menu?rid=1&tid=1')
+    assert response.status_code == 200
+    assert b'Paneer Tikka' in response.data
+    assert b'Pepperoni Pizza' not in response.data
+
+
+def test_search_limit_is_clamped(client):
+    for limit, expected in ((-1, 1), (0, 1), (1, 1), (500, 2)):
+        response = client.get(f'/api/menu/search?rid=1&category=Pizza&category=Starters&limit={limit}')
+        assert len(response.json['results']) == expected
@@ -0,0 +1,56 @@
+import pytest
+from models import MenuItem
+from importer import import_data
+
+
+@pytest.fixture
+def seed_rows():
+    return [MenuItem(name='Tea', price=20, category='Drinks', restaurant_id=1),
+            MenuItem(name='Coffee', price=40, category='Drinks', restaurant_id=1)]
+
+
+def test_delta_since_version(client):
+    snapshot = client.get('/api/menu?rid=1').json
+    assert snapshot['full'] and [i['name'] for i in snapshot['items']] == ['Tea', 'Coffee']
+
+    client.post('/admin/update_item_availability', json={'item_id': 1, 'is_available': False})
+    client.post('/admin/delete_menu_item', data={'item_id': 2})
+
+    delta = client.get(f'/api/menu?rid=1&since={snapshot["version"]}').json
+    assert delta['full'] is False
+    assert [(i['id'], i['is_available']) for i in delta['items']] == [(1, False)]
+    assert delta['deleted'] == [2]
+    assert delta['version'] > snapshot['version']
+
+
+def test_etag_returns_not_modified(client):
+    response = client.get('/api/menu?rid=1')
+    assert response.headers['ETag'].startswith('"menu-1-')
+
+    cached = client.get('/api/menu?rid=1', headers={'If-None-Match': response.headers['ETag']})
+    assert cached.status_code == 304
+
+
+def test_bulk_import_forces_full_snapshot(app, client):
+    version = client.get('/api/menu?rid=1').json['version']
+    with app.app_context():
+        import_data(1, 'menu', 'name,price\nCake,90\n', 'csv')
+
+    snapshot = client.get(f'/api/menu?rid=1&since={version}').json
+    assert snapshot['full'] is True
+    assert [i['name'] for i in snapshot['items']] == ['Tea', 'Coffee', 'Cake']
+
+
+def test_service_worker_is_served_from_root(client):
+    response = client.get('/menu-sw.js')
+    assert response.status_code == 200
+    assert b'SNAPSHOT_CACHE' in response.data
+
+
+def test_menu_shell_has_no_items(client):
+    shell = client.get('/menu?rid=1&shell=1')
+    assert shell.status_code == 200
+    assert b'Cafe' in shell.data and b'Coffee' not in shell.data
+    assert b'data-menu-version=""' in shell.data
+
+    assert client.get('/menu?rid=999&shell=1').status_code == 404
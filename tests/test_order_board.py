@@ -0,0 +1,77 @@
+import pytest
+from app import create_app, socketio
+from extensions import db
+from models import MenuItem, Table, Order, OrderItem
+from tasks import task_queue
+
+
+@pytest.fixture
+def env(env, tmp_path):
+    env.setenv('DATABASE_URL', f'sqlite:///{tmp_path / "board.db"}')
+    return env
+
+
+@pytest.fixture
+def seed_rows():
+    return [Table(table_number='4', restaurant_id=1),
+            MenuItem(name='Tea', price=20, restaurant_id=1),
+            Order(total_amount=20, status='preparing', table_id=1, restaurant_id=1),
+            Order(total_amount=20, status='completed', table_id=1, restaurant_id=1),
+            OrderItem(quantity=2, price=20, order_id=1, menu_item_id=1)]
+
+
+@pytest.fixture
+def app(app):
+    # Build the app again so the board is warmed from the populated database
+    app = create_app()
+    app.config.update({"TESTING": True})
+    yield app
+
+
+def test_board_is_warmed_with_active_orders_only(client):
+    orders = client.get('/api/orders?status=active').json
+
+    assert [o['id'] for o in orders] == [1]
+    assert orders[0]['items'][0] == {'id': 1, 'name': 'Tea', 'quantity': 2, 'price': 20.0,
+                                     'special_instructions': None}
+
+
+def test_place_order_and_status_updates_keep_board_in_step(client):
+    order_id = client.post('/place_order', json={
+        'paymentId': 'pay_1',
+        'cart': {'restaurantId': 1, 'tableId': 1, 'total': 20,
+                 'items': [{'id': 1, 'quantity': 1, 'price': 20}]}
+    }).json['order_id']
+
+    assert [o['id'] for o in client.get('/api/orders?status=pending').json] == [order_id]
+
+    client.put(f'/api/orders/{order_id}/status', json={'status': 'completed'})
+    assert client.get('/api/orders?status=pending').json == []
+    assert client.get('/api/orders/board/check').json['consistent']
+
+
+def test_consistency_check_detects_and_repairs_drift(app, client):
+    with app.app_context():
+        db.session.get(Order, 2).status = 'ready'
+        db.session.commit()
+
+    report = client.get('/api/orders/board/check?repair=1').json
+    assert report['missing'] == [2]
+    assert client.get('/api/orders/board/check').json['consistent']
+    assert [o['id'] for o in client.get('/api/orders?status=ready').json] == [2]
+
+
+def test_failed_broadcast_still_boards_the_order(client, monkeypatch):
+    def emit(*args, **kwargs):
+        raise RuntimeError('socket down')
+
+    monkeypatch.setattr(socketio, 'emit', emit)
+    monkeypatch.setattr(task_queue, 'retry_delay', 0)
+    order_id = client.post('/place_order', json={
+        'paymentId': 'pay_1',
+        'cart': {'restaurantId': 1, 'tableId': 1, 'total': 20,
+                 'items': [{'id': 1, 'quantity': 1, 'price': 20}]}
+    }).json['order_id']
+
+    assert task_queue.dead_letters[-1]['task'] == 'broadcast_new_order'
+    assert [o['id'] for o in client.get('/api/orders?status=pending').json] == [order_id]
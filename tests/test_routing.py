@@ -0,0 +1,70 @@
+import pytest
+import sqlalchemy as sa
+from app import create_app
+from extensions import db
+from models import Order
+from routing import USE_REPLICA, copy_sqlite_database
+
+
+@pytest.fixture
+def env(env, tmp_path):
+    env.setenv('DATABASE_URL', f'sqlite:///{tmp_path / "primary.db"}')
+    env.setenv('DATABASE_REPLICA_URLS', f'sqlite:///{tmp_path / "replica.db"}')
+    return env
+
+
+@pytest.fixture
+def app(app, tmp_path):
+    app.primary_url = f'sqlite:///{tmp_path / "primary.db"}'
+    app.replica_url = f'sqlite:///{tmp_path / "replica.db"}'
+    copy_sqlite_database(app.primary_url, app.replica_url)
+    yield app
+
+
+def add_order(app):
+    with app.app_context():
+        db.session.add(Order(total_amount=10, table_id=1, restaurant_id=1))
+        db.session.commit()
+
+
+def login(client):
+    with client.session_transaction() as sess:
+        sess['restaurant_id'] = 1
+
+
+def test_get_orders_reads_from_lagging_replica(app):
+    client = app.test_client()
+    login(client)
+    add_order(app)
+
+    assert client.get('/api/orders').json == []
+
+    copy_sqlite_database(app.primary_url, app.replica_url)
+    assert len(client.get('/api/orders').json) == 1
+
+
+def test_client_reads_its_own_writes(app):
+    client = app.test_client()
+    login(client)
+    response = client.post('/place_order', json={
+        'paymentId': 'pay_1',
+        'cart': {'restaurantId': 1, 'tableId': 1, 'total': 20, 'items': []}
+    })
+    assert response.json['success']
+
+    # The replica has not caught up, but this client was pinned to the primary
+    assert len(client.get('/api/orders').json) == 1
+    assert client.get(f'/confirmation?order_id={response.json["order_id"]}').status_code == 200
+
+
+def test_session_reads_from_a_single_replica(app, monkeypatch, tmp_path):
+    second_url = f'sqlite:///{tmp_path / "replica2.db"}'
+    copy_sqlite_database(app.primary_url, second_url)
+    monkeypatch.setenv('DATABASE_REPLICA_URLS', f'{app.replica_url},{second_url}')
+    app = create_app()
+
+    with app.test_request_context():
+        db.session.info[USE_REPLICA] = True
+        binds = {db.session.get_bind(mapper=sa.inspect(Order)) for _ in range(50)}
+        assert len(binds) == 1
+        assert binds.pop() is not db.engines[None]
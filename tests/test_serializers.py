@@ -0,0 +1,35 @@
+from datetime import datetime
+
+import pytest
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+import serializers
+from serializers import ORDER, MENU_ITEM, JSONProvider, SocketJSON
+
+
+def test_schema_dumps_row_tuples():
+    row = (1, 2, '7', 'pending', 250.0, datetime(2026, 1, 2, 19, 30))
+
+    assert ORDER.dump(row) == {
+        'id': 1, 'restaurant_id': 2, 'table_number': '7', 'status': 'pending',
+        'total_amount': 250.0, 'created_at': '2026-01-02T19:30:00'
+    }
+    assert MENU_ITEM.dump_many([(1, 'Tea', None, 20.0, 'Drinks', None, 1)])[0]['is_available'] is True
+
+
+@pytest.mark.parametrize('fast_backend', [True, False])
+def test_json_provider_matches_default_provider(monkeypatch, fast_backend):
+    if not fast_backend:
+        monkeypatch.setattr(serializers, 'orjson', None)
+    app = Flask(__name__)
+    data = {'b': 1, 'a': [1.5, None, 'x'], 'when': datetime(2026, 1, 2, 19, 30)}
+
+    fast, default = JSONProvider(app), DefaultJSONProvider(app)
+    assert fast.loads(fast.dumps(data)) == default.loads(default.dumps(data))
+    assert fast.loads('{"a": [1, 2]}') == {'a': [1, 2]}
+
+
+def test_socket_json_accepts_packet_kwargs():
+    encoded = SocketJSON.dumps({'id': 1}, separators=(',', ':'))
+    assert SocketJSON.loads(encoded) == {'id': 1}
@@ -0,0 +1,290 @@
+import threading
+import time
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.exc import IntegrityError
+from flask import template_rendered
+from werkzeug.security import generate_password_hash
+from app import create_app
+from extensions import db
+from models import Restaurant, MenuItem, Table, Order, OrderItem, ShardAssignment
+from admission import admission
+from routing import ShardMap, ShardMovingError, restaurant_scope, shard_map, shard_scope
+from importer import import_data
+from menu_sync import menu_snapshot, menu_version
+from sharding import (ShardMoveError, create_restaurant, create_shard_schemas, find_restaurant_id,
+                      move_restaurant, register_id_ranges)
+
+
+@pytest.fixture
+def env(env, tmp_path):
+    env.setenv('DATABASE_URL', f'sqlite:///{tmp_path / "default.db"}')
+    env.setenv('DATABASE_SHARDS', f'east=sqlite:///{tmp_path / "east.db"},'
+                                  f'west=sqlite:///{tmp_path / "west.db"}')
+    env.setenv('SHARD_MAP_TTL', '0')
+    return env
+
+
+@pytest.fixture
+def app(env):
+    # Restaurants are registered through the shard directory, so nothing is seeded
+    app = create_app()
+    app.config.update({"TESTING": True})
+
+    with app.app_context():
+        db.create_all()
+        register_id_ranges()
+        create_shard_schemas()
+    yield app
+
+
+def add_restaurant(name):
+    """Create a restaurant with a table and a menu item on whichever shard it lands."""
+    restaurant_id = create_restaurant(name=name, email=f'{name}@example.com',
+                                      password=generate_password_hash('x'))
+    with restaurant_scope(restaurant_id):
+        db.session.add(Table(table_number='1', restaurant_id=restaurant_id))
+        db.session.add(MenuItem(name=f'{name} special', price=5, category='Mains',
+                                restaurant_id=restaurant_id))
+        db.session.commit()
+    return restaurant_id
+
+
+def shard_of(restaurant_id):
+    return db.session.get(ShardAssignment, restaurant_id).shard
+
+
+def test_restaurants_are_spread_across_shards(app):
+    with app.app_context():
+        ids = [add_restaurant(name) for name in ('cafe', 'diner', 'bistro')]
+        assert sorted(shard_of(rid) for rid in ids) == ['default', 'east', 'west']
+
+        # Each restaurant's rows exist only on its own shard
+        for rid in ids:
+            for shard in ('default', 'east', 'west'):
+                with shard_scope(shard):
+                    found = MenuItem.query.filter_by(restaurant_id=rid).count()
+                assert found == (1 if shard == shard_of(rid) else 0)
+
+    rendered = []
+
+    def record(sender, template, context, **extra):
+        rendered.append(context)
+
+    client = app.test_client()
+    with template_rendered.connected_to(record, app):
+        assert client.get('/').status_code == 200
+    assert [r.name for r in rendered[0]['restaurants']] == ['cafe', 'diner', 'bistro']
+
+    east_id = ids[1]
+    results = client.get(f'/api/menu/search?rid={east_id}&q=diner').json['results']
+    assert [item['name'] for item in results] == ['diner special']
+
+
+def test_login_and_orders_use_the_restaurants_shard(app):
+    with app.app_context():
+        add_restaurant('cafe')
+        rid = add_restaurant('diner')
+        assert shard_of(rid) == 'east'
+        with restaurant_scope(rid):
+            table_id = Table.query.filter_by(restaurant_id=rid).one().id
+            item_id = MenuItem.query.filter_by(restaurant_id=rid).one().id
+
+    client = app.test_client()
+    response = client.post('/admin/login', data={'email': 'diner@example.com', 'password': 'x'})
+    assert response.status_code == 302
+
+    with app.app_context():
+        # Not on the default database, the directory found it on its shard
+        assert Restaurant.query.filter_by(email='diner@example.com').first() is None
+
+    with client.session_transaction() as sess:
+        sess['restaurant_id'] = rid
+
+    order = client.post('/place_order', json={
+        'paymentId': 'pay_1',
+        'cart': {'restaurantId': rid, 'tableId': table_id, 'total': 5,
+                 'items': [{'id': item_id, 'quantity': 1, 'price': 5}]}
+    }).json
+    assert order['success']
+
+    orders = client.get('/api/orders').json
+    assert [o['id'] for o in orders] == [order['order_id']]
+    assert client.get(f"/confirmation?order_id={order['order_id']}&rid={rid}").status_code == 200
+
+
+def test_move_restaurant_copies_flips_and_purges(app):
+    with app.app_context():
+        rid = add_restaurant('cafe')
+        with restaurant_scope(rid):
+            table_id = Table.query.filter_by(restaurant_id=rid).one().id
+            item_id = MenuItem.query.filter_by(restaurant_id=rid).one().id
+            order = Order(total_amount=5, table_id=table_id, restaurant_id=rid)
+            db.session.add(order)
+            db.session.flush()
+            db.session.add(OrderItem(quantity=1, price=5, order_id=order.id, menu_item_id=item_id))
+            db.session.commit()
+
+        result = move_restaurant(rid, 'west', settle=0)
+        assert (result['source'], result['target']) == ('default', 'west')
+        assert result['copied']['order_item'] == 1
+        assert result['purged']['menu_item'] == 1
+
+        assert shard_of(rid) == 'west'
+        assert db.session.get(Restaurant, rid) is None
+        with restaurant_scope(rid):
+            assert db.session.get(Restaurant, rid).name == 'cafe'
+            assert OrderItem.query.count() == 1
+
+        with pytest.raises(ShardMoveError):
+            move_restaurant(rid, 'west', settle=0)
+
+    client = app.test_client()
+    results = client.get(f'/api/menu/search?rid={rid}&q=cafe').json['results']
+    assert [item['name'] for item in results] == ['cafe special']
+
+
+def test_move_between_populated_shards_keeps_ids(app):
+    with app.app_context():
+        rid = add_restaurant('cafe')
+        other = add_restaurant('diner')
+        target = shard_of(other)
+        first_id, last_id = shard_map.id_range(target, db.engines[None])
+        item_id = MenuItem.query.filter_by(restaurant_id=rid).one().id
+        with restaurant_scope(other):
+            other_item_id = MenuItem.query.filter_by(restaurant_id=other).one().id
+        # Each shard numbers rows from its own range
+        assert item_id < first_id <= other_item_id <= last_id
+
+        move_restaurant(rid, target, settle=0)
+
+        with restaurant_scope(rid):
+            assert MenuItem.query.filter_by(restaurant_id=rid).one().id == item_id
+            # The moved menu's change log restarts with a reset in the target's range
+            assert menu_snapshot(rid, since=1)['full']
+            assert menu_version(rid) >= first_id
+
+            # New rows on the target stay inside its range despite the moved-in ids
+            db.session.add(MenuItem(name='Soup', price=4, restaurant_id=rid))
+            db.session.commit()
+            new_id = MenuItem.query.filter_by(name='Soup').one().id
+        assert first_id < new_id <= last_id and new_id != other_item_id
+
+        with restaurant_scope(other):
+            plan = import_data(other, 'menu', 'name,price\nTea,2\nCake,3\n', 'csv')
+            ids = [item.id for item in MenuItem.query.filter(MenuItem.name.in_(['Tea', 'Cake']))]
+        assert len(plan['create']) == 2
+        assert len(set(ids)) == 2 and all(first_id <= i <= last_id for i in ids)
+
+
+def test_writes_are_rejected_while_moving(app):
+    with app.app_context():
+        rid = add_restaurant('cafe')
+        db.session.get(ShardAssignment, rid).status = 'moving'
+        db.session.commit()
+        item_id = MenuItem.query.filter_by(restaurant_id=rid).one().id
+    shard_map.clear()
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['restaurant_id'] = rid
+
+    assert client.get('/api/orders?status=all').status_code == 200
+    response = client.post('/admin/update_item_availability',
+                           json={'item_id': item_id, 'is_available': False})
+    assert response.status_code == 503
+    assert 'Retry-After' in response.headers
+
+    with app.app_context():
+        with restaurant_scope(rid):
+            with pytest.raises(ShardMovingError):
+                import_data(rid, 'tables', '[{"table_number": "1-3"}]', 'json')
+            with pytest.raises(ShardMovingError):
+                db.session.execute(sa.update(Table).where(Table.restaurant_id == rid).values(capacity=2))
+            assert Table.query.filter_by(restaurant_id=rid).count() == 1
+
+
+def test_admin_routes_ignore_rid(app):
+    with app.app_context():
+        other = add_restaurant('cafe')
+        rid = add_restaurant('diner')
+        assert shard_of(other) != shard_of(rid)
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['restaurant_id'] = rid
+
+    response = client.post(f'/admin/add_menu_item?rid={other}',
+                           data={'name': 'Soup', 'price': '4', 'category': 'Starters'})
+    assert response.status_code == 302
+    assert client.get(f'/admin/menu?rid={other}').status_code == 200
+
+    with app.app_context():
+        with restaurant_scope(rid):
+            assert MenuItem.query.filter_by(restaurant_id=rid, name='Soup').count() == 1
+        with restaurant_scope(other):
+            assert MenuItem.query.filter_by(name='Soup').count() == 0
+
+
+def test_failed_registration_frees_the_email(app):
+    with app.app_context():
+        # name is required, so the shard insert fails after the directory commit
+        with pytest.raises(IntegrityError):
+            create_restaurant(name=None, email='cafe@example.com', password='x')
+        assert ShardAssignment.query.filter_by(email='cafe@example.com').count() == 0
+        assert find_restaurant_id('cafe@example.com') is None
+
+        add_restaurant('cafe')
+        assert find_restaurant_id('cafe@example.com') is not None
+
+
+def test_shed_requests_skip_the_shard_lookup(app, monkeypatch):
+    with app.app_context():
+        rid = add_restaurant('diner')
+    lookups = []
+    lookup = shard_map.lookup
+    monkeypatch.setattr(shard_map, 'lookup', lambda *args: lookups.append(args) or lookup(*args))
+    monkeypatch.setattr(admission, 'browse_concurrency', 0)
+
+    assert app.test_client().get(f'/menu?rid={rid}&tid=1').status_code == 503
+    assert lookups == []
+
+
+def test_shard_map_cache_is_capped(app):
+    cache = ShardMap(ttl=60, max_entries=2)
+    with app.app_context():
+        for rid in (1, 2, 1, 3):
+            cache.lookup(rid, db.engines[None])
+    assert list(cache._entries) == [1, 3]
+
+
+def test_concurrent_inserts_on_a_shard_get_distinct_ids(app):
+    with app.app_context():
+        add_restaurant('cafe')
+        rid = add_restaurant('diner')
+        assert shard_of(rid) == 'east'
+    inserted, errors = [], []
+
+    def add_table(number, hold=0):
+        with app.app_context():
+            try:
+                with restaurant_scope(rid):
+                    table = Table(table_number=number, restaurant_id=rid)
+                    db.session.add(table)
+                    db.session.flush()
+                    time.sleep(hold)
+                    db.session.commit()
+                    inserted.append(table.id)
+            except Exception as e:
+                errors.append(e)
+
+    # The first writer holds its id while the second one inserts
+    first = threading.Thread(target=add_table, args=('2', 0.3))
+    first.start()
+    time.sleep(0.1)
+    add_table('3')
+    first.join()
+
+    assert errors == []
+    assert len(set(inserted)) == 2
@@ -0,0 +1,151 @@
+import threading
+
+import pytest
+from flask import Flask
+from flask_socketio import SocketIO
+from app import socketio
+from extensions import db
+from models import MenuItem, Table
+from tasks import TaskQueue, task_queue
+
+
+def make_queue(workers, max_retries=1):
+    app = Flask(__name__)
+    app.config.update({
+        'TASK_QUEUE_WORKERS': workers,
+        'TASK_QUEUE_MAX_RETRIES': max_retries,
+        'TASK_QUEUE_RETRY_DELAY': 0
+    })
+    return TaskQueue(app)
+
+
+def test_worker_pool_drains_on_shutdown():
+    tq = make_queue(workers=2)
+    results = []
+
+    @tq.task
+    def collect(value):
+        results.append(value)
+
+    for i in range(50):
+        tq.enqueue(collect, i)
+    tq.shutdown()
+
+    assert sorted(results) == list(range(50))
+    assert tq.metrics()['completed'] == 50
+    assert tq.metrics()['depth'] == 0
+
+
+def test_workers_run_through_socketio_async_mode():
+    app = Flask(__name__)
+    app.config.update({'TASK_QUEUE_WORKERS': 2})
+    sio = SocketIO(app, async_mode='threading')
+    started = []
+    start_background_task = sio.start_background_task
+
+    def record_start(target, *args, **kwargs):
+        started.append(target)
+        return start_background_task(target, *args, **kwargs)
+
+    sio.start_background_task = record_start
+    tq = TaskQueue()
+    tq.init_app(app, sio)
+    results = []
+
+    @tq.task
+    def collect(value):
+        results.append(value)
+
+    for i in range(10):
+        tq.enqueue(collect, i)
+    tq.shutdown()
+
+    assert len(started) == 2
+    assert sorted(results) == list(range(10))
+
+
+def test_failing_task_is_retried_then_dead_lettered():
+    tq = make_queue(workers=0, max_retries=2)
+    calls = []
+
+    @tq.task
+    def flaky():
+        calls.append(1)
+        raise RuntimeError('printer offline')
+
+    tq.enqueue(flaky)
+
+    assert len(calls) == 3
+    assert tq.metrics()['retried'] == 2
+    assert tq.dead_letters[0]['task'] == 'flaky'
+
+
+@pytest.fixture
+def seed_rows():
+    return [Table(table_number='7', restaurant_id=1), MenuItem(name='Tea', price=20, restaurant_id=1)]
+
+
+def test_place_order_broadcasts_after_commit(app):
+    sio_client = socketio.test_client(app)
+    response = app.test_client().post('/place_order', json={
+        'paymentId': 'pay_1',
+        'cart': {'restaurantId': 1, 'tableId': 1, 'total': 20,
+                 'items': [{'id': 1, 'quantity': 1, 'price': 20}]}
+    })
+
+    assert response.json['success']
+    events = [e for e in sio_client.get_received() if e['name'] == 'new_order']
+    assert events[0]['args'][0]['table_number'] == '7'
+
+
+def test_rollback_discards_pending_tasks(app):
+    calls = []
+
+    @task_queue.task
+    def record():
+        calls.append(1)
+
+    with app.app_context():
+        db.session.add(Table(table_number='8', restaurant_id=1))
+        db.session.flush()
+        task_queue.enqueue_after_commit(db.session, record)
+        db.session.rollback()
+        db.session.commit()
+
+        assert Table.query.filter_by(table_number='8').count() == 0
+    assert calls == []
+
+
+class NoTimeoutThread(threading.Thread):
+    """Stands in for engineio's EventletThread, whose join() takes no timeout."""
+
+    def join(self):
+        super().join()
+
+
+def test_shutdown_does_not_join_with_a_timeout():
+    app = Flask(__name__)
+    app.config.update({'TASK_QUEUE_WORKERS': 2})
+    sio = SocketIO(app, async_mode='threading')
+
+    def start_background_task(target, *args, **kwargs):
+        worker = NoTimeoutThread(target=target, args=args, kwargs=kwargs, daemon=True)
+        worker.start()
+        return worker
+
+    sio.start_background_task = start_background_task
+    tq = TaskQueue()
+    tq.init_app(app, sio)
+    workers = list(tq.workers)
+    results = []
+
+    @tq.task
+    def collect(value):
+        results.append(value)
+
+    for i in range(10):
+        tq.enqueue(collect, i)
+    tq.shutdown()
+
+    assert sorted(results) == list(range(10))
+    assert tq.workers == [] and not any(worker.is_alive() for worker in workers)
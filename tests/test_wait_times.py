@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+
+import pytest
+from extensions import db
+from models import Order, OrderStatusEvent
+from tasks import task_queue
+from wait_times import QuantileSketch, prep_time_stats
+
+
+def test_quantile_sketch_relative_error():
+    sketch = QuantileSketch(relative_accuracy=0.02)
+    for seconds in range(1, 1001):
+        sketch.add(seconds)
+
+    assert sketch.count == 1000
+    assert sketch.quantile(0.5) == pytest.approx(500, rel=0.03)
+    assert sketch.quantile(0.99) == pytest.approx(990, rel=0.03)
+
+
+def place_order(client):
+    return client.post('/place_order', json={
+        'paymentId': 'pay_1',
+        'cart': {'restaurantId': 1, 'tableId': 1, 'total': 20, 'items': []}
+    }).json['order_id']
+
+
+def test_status_changes_are_logged_and_sketched(app, client):
+    assert client.get('/api/wait_time?rid=1').json['available'] is False
+
+    order_id = place_order(client)
+    client.put(f'/api/orders/{order_id}/status', json={'status': 'preparing'})
+    client.put(f'/api/orders/{order_id}/status', json={'status': 'ready'})
+
+    with app.app_context():
+        events = OrderStatusEvent.query.order_by(OrderStatusEvent.id).all()
+        assert [(e.from_status, e.to_status) for e in events] == [
+            (None, 'pending'), ('pending', 'preparing'), ('preparing', 'ready')]
+
+    stats = client.get('/api/prep_times').json
+    assert stats['pending']['overall']['count'] == 1
+    assert stats['preparing']['overall']['count'] == 1
+    assert client.get('/api/wait_time?rid=1').json['available'] is True
+
+
+def test_sketches_are_seeded_from_history(app, client):
+    started = datetime.utcnow() - timedelta(hours=1)
+    with app.app_context():
+        order = Order(total_amount=20, table_id=1, restaurant_id=1, created_at=started)
+        db.session.add(order)
+        db.session.flush()
+        db.session.add_all([
+            OrderStatusEvent(order_id=order.id, restaurant_id=1, from_status=None,
+                             to_status='pending', created_at=started),
+            OrderStatusEvent(order_id=order.id, restaurant_id=1, from_status='pending',
+                             to_status='preparing', created_at=started + timedelta(minutes=5)),
+            OrderStatusEvent(order_id=order.id, restaurant_id=1, from_status='preparing',
+                             to_status='ready', created_at=started + timedelta(minutes=15)),
+        ])
+        db.session.commit()
+    prep_time_stats.clear()
+
+    estimate = client.get('/api/wait_time?rid=1').json
+    assert estimate['minutes'] == pytest.approx(15, abs=1)
+
+
+def test_invalid_statuses_are_rejected(app, client):
+    order_id = place_order(client)
+    for body in ({}, {'status': None}, {'status': 'lost'}):
+        assert client.put(f'/api/orders/{order_id}/status', json=body).status_code == 400
+
+    with app.app_context():
+        assert db.session.get(Order, order_id).status == 'pending'
+        assert OrderStatusEvent.query.count() == 1
+
+
+def test_load_before_record_task_counts_transition_once(app, client, monkeypatch):
+    order_id = place_order(client)
+    prep_time_stats.clear()
+
+    # Load the sketches after the commit but before the record task runs
+    deferred = []
+    monkeypatch.setattr(task_queue, 'enqueue_after_commit',
+                        lambda session, task, *args: deferred.append((task, args)))
+    client.put(f'/api/orders/{order_id}/status', json={'status': 'preparing'})
+    assert client.get('/api/prep_times').json['pending']['overall']['count'] == 1
+
+    for task, args in deferred:
+        with app.app_context():
+            task(*args)
+    assert client.get('/api/prep_times').json['pending']['overall']['count'] == 1
+
+
+def test_wait_time_needs_a_known_restaurant(client):
+    assert client.get('/api/wait_time?rid=999').status_code == 404
+    assert client.get('/api/wait_time?rid=1').json['available'] is False
+    # Neither lookup keeps an entry for a restaurant without events
+    assert prep_time_stats._sketches == {}
@@ -0,0 +1,185 @@
+import math
+import threading
+from datetime import datetime, timedelta
+
+from extensions import db
+from models import Order, OrderStatusEvent
+from routing import primary
+
+# Time spent in these statuses is what a customer waits for
+WAIT_STATUSES = ('pending', 'preparing')
+PERCENTILES = (0.5, 0.9, 0.99)
+MIN_HOURLY_SAMPLES = 5
+WARM_DAYS = 14
+# Transitions this recent at load time may still have their record task pending
+LOAD_OVERLAP = timedelta(hours=1)
+
+
+class QuantileSketch:
+    """Log-bucketed histogram with bounded relative error (DDSketch style).
+
+    Adding a value is O(1) and memory grows with the log of the value range,
+    not with the number of samples.
+    """
+
+    def __init__(self, relative_accuracy=0.02):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value):
+        self.count += 1
+        if value <= 0:
+            self.zero_count += 1
+            return
+        index = math.ceil(math.log(value) / self.log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+class PrepTimeStats:
+    """Per-restaurant time-in-status sketches, bucketed by hour of day (UTC).
+
+    Sketches are updated incrementally as transitions are committed. A
+    restaurant is seeded once from its last WARM_DAYS of events on first use.
+    """
+
+    def __init__(self):
+        self._sketches = {}     # restaurant id -> {(status, hour or None): sketch}
+        self._loaded = {}       # restaurant id -> (loaded_at, {(order id, changed_at)} loaded recently)
+        self._lock = threading.RLock()
+
+    def clear(self):
+        with self._lock:
+            self._sketches.clear()
+            self._loaded.clear()
+
+    def _ensure_loaded(self, restaurant_id):
+        if restaurant_id in self._sketches:
+            return
+        loaded_at = datetime.utcnow()
+        since = loaded_at - timedelta(days=WARM_DAYS)
+        with primary():
+            rows = (db.session.query(OrderStatusEvent.order_id, OrderStatusEvent.from_status,
+                                     OrderStatusEvent.created_at, Order.created_at)
+                    .join(Order, OrderStatusEvent.order_id == Order.id)
+                    .filter(OrderStatusEvent.restaurant_id == restaurant_id,
+                            OrderStatusEvent.created_at >= since)
+                    .order_by(OrderStatusEvent.order_id, OrderStatusEvent.created_at, OrderStatusEvent.id)
+                    .all())
+        if not rows:
+            # Keep no entry until the restaurant has events; its first record() adds one
+            return
+        self._sketches[restaurant_id] = {}
+        entered = {}
+        recent = set()
+        for order_id, from_status, changed_at, order_created_at in rows:
+            entered_at = entered.get(order_id, order_created_at)
+            if from_status is not None:
+                self._add(restaurant_id, from_status, entered_at, changed_at)
+                if changed_at >= loaded_at - LOAD_OVERLAP:
+                    recent.add((order_id, changed_at))
+            entered[order_id] = changed_at
+        self._loaded[restaurant_id] = (loaded_at, recent)
+
+    def _add(self, restaurant_id, status, entered_at, left_at):
+        seconds = (left_at - entered_at).total_seconds()
+        sketches = self._sketches.setdefault(restaurant_id, {})
+        for key in ((status, entered_at.hour), (status, None)):
+            sketch = sketches.get(key)
+            if sketch is None:
+                sketch = sketches[key] = QuantileSketch()
+            sketch.add(seconds)
+
+    def record(self, restaurant_id, order_id, status, entered_at, left_at):
+        """Record that an order spent entered_at..left_at in status."""
+        with self._lock:
+            self._ensure_loaded(restaurant_id)
+            # Skip transitions the load already counted: those it read, and
+            # any too old to have been uncommitted when it ran
+            loaded_at, recent = self._loaded.get(restaurant_id, (None, ()))
+            if loaded_at and ((order_id, left_at) in recent or left_at < loaded_at - LOAD_OVERLAP):
+                return
+            self._add(restaurant_id, status, entered_at, left_at)
+
+    def _sketch(self, restaurant_id, status, hour):
+        sketches = self._sketches.get(restaurant_id, {})
+        sketch = sketches.get((status, hour))
+        if sketch is None or sketch.count < MIN_HOURLY_SAMPLES:
+            sketch = sketches.get((status, None))
+        return sketch
+
+    def estimate_wait(self, restaurant_id, hour=None):
+        """Estimated seconds from order to ready, as p50/p90 sums over WAIT_STATUSES."""
+        hour = datetime.utcnow().hour if hour is None else hour
+        with self._lock:
+            self._ensure_loaded(restaurant_id)
+            estimate = {'p50': 0.0, 'p90': 0.0, 'samples': 0}
+            for status in WAIT_STATUSES:
+                sketch = self._sketch(restaurant_id, status, hour)
+                if sketch is None:
+                    return None
+                estimate['p50'] += sketch.quantile(0.5)
+                estimate['p90'] += sketch.quantile(0.9)
+                estimate['samples'] = max(estimate['samples'], sketch.count)
+            return estimate
+
+    def percentiles(self, restaurant_id):
+        """p50/p90/p99 seconds per status, overall and per hour of day."""
+        with self._lock:
+            self._ensure_loaded(restaurant_id)
+            stats = {}
+            for (status, hour), sketch in self._sketches.get(restaurant_id, {}).items():
+                entry = {f'p{round(q * 100)}': round(sketch.quantile(q), 1) for q in PERCENTILES}
+                entry['count'] = sketch.count
+                by_status = stats.setdefault(status, {'overall': None, 'hours': {}})
+                if hour is None:
+                    by_status['overall'] = entry
+                else:
+                    by_status['hours'][hour] = entry
+            return stats
+
+
+def record_transition(order, from_status, to_status):
+    """Append a status event for order in the current transaction.
+
+    Returns (entered_at, changed_at) for the status being left, or None when
+    the order is new.
+    """
+    entered_at = None
+    if from_status is not None:
+        last_change = (db.session.query(OrderStatusEvent.created_at)
+                       .filter(OrderStatusEvent.order_id == order.id)
+                       .order_by(OrderStatusEvent.created_at.desc(), OrderStatusEvent.id.desc())
+                       .limit(1)
+                       .scalar())
+        entered_at = last_change or order.created_at
+
+    changed_at = datetime.utcnow()
+    db.session.add(OrderStatusEvent(
+        order_id=order.id,
+        restaurant_id=order.restaurant_id,
+        from_status=from_status,
+        to_status=to_status,
+        created_at=changed_at
+    ))
+    if entered_at is None:
+        return None
+    return entered_at, changed_at
+
+
+prep_time_stats = PrepTimeStats()